@@ -0,0 +1,139 @@
+"""
+Throughput of pixel data compression backends on a synthetic corpus: the
+python backend of `compress_pixel_data` against `img-compressor --manifest`
+when the binary is on PATH. Images are kept locally, nothing is uploaded.
+With `--jpeg` the corpus is stored as JPEG Baseline, which the python backend
+copies without decoding. Run from `services/dicom-pipeline`:
+
+    python benchmarks/compression.py --num-files 200 --size 512 --workers 8
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+import pydicom
+from PIL import Image
+from pydicom.dataset import FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import ExplicitVRLittleEndian, JPEGBaseline8Bit, MRImageStorage, generate_uid
+from dicom_pipeline.ops.raw.pixel_data import compress_dicom_files
+from dicom_pipeline.ops.utils import balance_by_size
+
+
+def synthetic_corpus(directory, num_files, size, jpeg=False, seed=0):
+    """
+    Writes `num_files` 16 bit MR images of `size` x `size` with a smooth
+    gradient and noise, so encoders do not get trivially compressible input;
+    `jpeg` stores them windowed to 8 bit and encapsulated as JPEG Baseline.
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.add.outer(np.arange(size), np.arange(size)) * (3000 / (2 * size))
+    series_instance_uid = generate_uid()
+    files = []
+    for i in range(num_files):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = MRImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = JPEGBaseline8Bit if jpeg else ExplicitVRLittleEndian
+        obj = pydicom.Dataset()
+        obj.file_meta = meta
+        obj.SOPClassUID = MRImageStorage
+        obj.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        obj.SeriesInstanceUID = series_instance_uid
+        obj.InstanceCreationDate = "20040826"
+        obj.Modality = "MR"
+        obj.Rows = obj.Columns = size
+        obj.SamplesPerPixel = 1
+        obj.PhotometricInterpretation = "MONOCHROME2"
+        obj.BitsAllocated = obj.BitsStored = 16
+        obj.HighBit = 15
+        obj.PixelRepresentation = 0
+        obj.WindowCenter = 1500
+        obj.WindowWidth = 3000
+        pixels = np.clip(gradient + rng.normal(0, 50, (size, size)), 0, 4095)
+        if jpeg:
+            obj.BitsAllocated = obj.BitsStored = 8
+            obj.HighBit = 7
+            del obj.WindowCenter, obj.WindowWidth
+            buffer = io.BytesIO()
+            Image.fromarray((pixels / 16).astype(np.uint8)).save(buffer, format="JPEG", quality=95)
+            obj.PixelData = encapsulate([buffer.getvalue()])
+            obj["PixelData"].VR = "OB"
+            obj["PixelData"].is_undefined_length = True
+        else:
+            obj.PixelData = pixels.astype(np.uint16).tobytes()
+        filepath = os.path.join(directory, f"synthetic_{i:05d}.dcm")
+        obj.save_as(filepath, enforce_file_format=True)
+        files.append(filepath)
+    return files
+
+
+def run_python(files, workdir, workers):
+    results = compress_dicom_files(files, os.path.join(workdir, "python"), "benchmark", workers)
+    return sum(r["status"] == "ok" for r in results)
+
+
+def run_rust(files, workdir, binary, workers):
+    sizes = {f: os.path.getsize(f) for f in files}
+    processes = []
+    for i, shard in enumerate(balance_by_size(sizes, workers)):
+        manifest = os.path.join(workdir, f"manifest-{i:03d}.json")
+        with open(manifest, "w") as fp:
+            json.dump({
+                "source_bucket": "", "source_prefix": "",
+                "target_bucket": "", "target_prefix": "benchmark",
+                "files": shard,
+            }, fp)
+        processes.append(subprocess.Popen(
+            [binary, "--manifest", manifest], cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ))
+    num_ok = 0
+    for process in processes:
+        stdout, _ = process.communicate()
+        num_ok += sum(json.loads(line).get("status") == "ok" for line in stdout.decode().splitlines() if line.startswith("{"))
+    return num_ok
+
+
+def report(name, files, elapsed, num_ok):
+    num_bytes = sum(os.path.getsize(f) for f in files)
+    print(
+        f"{name:>7}: {num_ok}/{len(files)} files in {elapsed:.2f}s, "
+        f"{len(files) / elapsed:.1f} files/s, {num_bytes / elapsed / 1e6:.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-files", type=int, default=100)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--binary", default="img-compressor")
+    parser.add_argument("--jpeg", action="store_true", help="store corpus as JPEG Baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        os.makedirs(corpus)
+        files = synthetic_corpus(corpus, args.num_files, args.size, args.jpeg)
+        print(f"files: {len(files)}, size: {args.size}x{args.size}, workers: {args.workers}, jpeg: {args.jpeg}")
+
+        start = time.perf_counter()
+        num_ok = run_python(files, workdir, args.workers)
+        report("python", files, time.perf_counter() - start, num_ok)
+
+        binary = shutil.which(args.binary)
+        if binary is None:
+            print(f"   rust: skipped, `{args.binary}` not found on PATH")
+            return
+        start = time.perf_counter()
+        num_ok = run_rust(files, workdir, binary, args.workers)
+        report("rust", files, time.perf_counter() - start, num_ok)
+
+
+if __name__ == "__main__":
+    main()
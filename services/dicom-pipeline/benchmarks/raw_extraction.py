@@ -0,0 +1,66 @@
+"""
+Microbenchmark of per file overhead in raw extraction: compares the original
+loop over keywords with `cast` and `inflection` against `ExtractionPlan` on
+sample files from `data/dicom-files`. Run from `services/dicom-pipeline`:
+
+    python benchmarks/raw_extraction.py --repeat 200
+"""
+import argparse
+import glob
+import time
+import numpy as np
+import pydicom
+from dagster import get_dagster_logger
+from dicom_pipeline.assets.raw import COLUMN_MAP
+from dicom_pipeline.assets.raw.lib import ExtractionPlan, cast, snake_case
+
+
+def legacy_extract(log, obj, columns):
+    row = [cast(log, obj.get(key, np.nan)) for key in columns]
+    names = [snake_case.__wrapped__(key) for key in columns]
+    return row, names
+
+
+def plan_extract(log, obj, plan):
+    return plan.extract(log, obj), plan.output_names
+
+
+def measure(files, repeat, extract):
+    """
+    Returns mean microseconds per file spent on value extraction only; datasets
+    are parsed anew for every round as pydicom converts elements lazily.
+    """
+    elapsed = 0.0
+    for _ in range(repeat):
+        datasets = [pydicom.dcmread(f, stop_before_pixels=True) for f in files]
+        start = time.perf_counter()
+        for obj in datasets:
+            extract(obj)
+        elapsed += time.perf_counter() - start
+    return elapsed / (repeat * len(files)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", default="../../data/dicom-files/*.dcm")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(args.files))
+    columns = sorted(set().union(*COLUMN_MAP.values()))
+    log = get_dagster_logger()
+
+    start = time.perf_counter()
+    plan = ExtractionPlan(columns)
+    compile_us = (time.perf_counter() - start) * 1e6
+
+    before = measure(files, args.repeat, lambda obj: legacy_extract(log, obj, columns))
+    after = measure(files, args.repeat, lambda obj: plan_extract(log, obj, plan))
+    print(f"files: {len(files)}, columns: {len(columns)}, rounds: {args.repeat}")
+    print(f"plan compile: {compile_us:.1f} us (once per run)")
+    print(f"per file before: {before:.1f} us")
+    print(f"per file after:  {after:.1f} us ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-from .processed_images import processed_images
\ No newline at end of file
+from .processed_images import processed_images
+from .image_volumes import image_volumes
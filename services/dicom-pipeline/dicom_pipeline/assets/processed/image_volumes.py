@@ -0,0 +1,194 @@
+from pyspark.sql import DataFrame as SparkDF
+from typing import BinaryIO, Optional, Union
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+import pydicom
+from pydicom.pixels import pixel_array
+from dagster import (
+	AssetExecutionContext,
+	AssetIn,
+	AutoMaterializePolicy,
+	MetadataValue,
+	asset
+)
+from ...ops.raw.pixel_data import first_value
+from ...ops.raw.s3_headers import is_s3_uri, read_s3_dicom_header, s3_client, split_s3_uri
+from ...resources.config import (
+	PARTITION_MONTHLY,
+	VOLUME_STORE_PATH,
+	VolumeConfig
+)
+
+VOLUME_COLUMNS = [
+	"series_instance_uid",
+	"sop_instance_uid",
+	"filename",
+	"rows",
+	"columns",
+	"number_of_frames",
+	"image_position_patient",
+	"image_orientation_patient",
+	"pixel_spacing",
+	"slice_location",
+	"instance_number",
+	"slice_thickness",
+	"spacing_between_slices",
+]
+
+
+def as_vector(value, size: int) -> Optional[np.ndarray]:
+    # multi valued attributes come as lists, missing ones as None or NaN
+    if value is None or np.ndim(value) == 0 or len(value) != size:
+        return None
+    vector = np.asarray(value, dtype=np.float64)
+    return None if np.isnan(vector).any() else vector
+
+
+def sort_slices(series: pd.DataFrame) -> tuple[pd.DataFrame, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Slices of a series ordered along the normal to their orientation, along
+    with position of every slice on the normal and the direction cosines;
+    `SliceLocation` and then `InstanceNumber` order slices without geometry.
+    """
+    orientation = as_vector(series.image_orientation_patient.iloc[0], 6)
+    positions = [as_vector(p, 3) for p in series.image_position_patient]
+    if orientation is not None and all(p is not None for p in positions):
+        row, column = orientation[:3], orientation[3:]
+        normal = np.cross(row, column)
+        distances = np.array([p @ normal for p in positions])
+        order = np.argsort(distances, kind="stable")
+        return series.iloc[order], distances[order], np.stack([row, column, normal])
+    key = "slice_location" if series.slice_location.notna().all() else "instance_number"
+    return series.sort_values(key, kind="stable"), None, None
+
+
+def rescale_of(filename: str) -> tuple[float, float]:
+    tags = ["RescaleSlope", "RescaleIntercept"]
+    if is_s3_uri(filename):
+        # header only, ranged reads stop before pixel data
+        obj, _ = read_s3_dicom_header(s3_client(), filename, tags)
+    else:
+        obj = pydicom.dcmread(filename, stop_before_pixels=True, specific_tags=tags)
+    return first_value(obj.get("RescaleSlope")) or 1.0, first_value(obj.get("RescaleIntercept")) or 0.0
+
+
+def dicom_source(filename: str) -> Union[str, BinaryIO]:
+    # objects on s3 are fetched whole, pixel data is the bulk of them
+    if not is_s3_uri(filename):
+        return filename
+    bucket, key = split_s3_uri(filename)
+    return io.BytesIO(s3_client().get_object(Bucket=bucket, Key=key)["Body"].read())
+
+
+def slice_spacing(series: pd.DataFrame, distances: Optional[np.ndarray]) -> float:
+    # distance between neighbouring slices, declared spacing when geometry is missing
+    if distances is not None and len(distances) > 1:
+        return float(np.median(np.diff(distances)))
+    for column in ("spacing_between_slices", "slice_thickness"):
+        value = pd.to_numeric(series[column], errors="coerce").dropna()
+        if len(value) > 0:
+            return float(value.iloc[0])
+    return 1.0
+
+
+@asset(
+	ins={"images": AssetIn(key_prefix="raw")},
+	auto_materialize_policy=AutoMaterializePolicy.eager(),
+    partitions_def=PARTITION_MONTHLY,
+    compute_kind="numpy",
+)
+def image_volumes(
+	context: AssetExecutionContext,
+	config: VolumeConfig,
+	images: SparkDF,
+) -> pd.DataFrame:
+    """
+    Series of the partition assembled into contiguous 3D volumes of shape
+    (slices, rows, columns): slices are sorted along the normal to
+    `ImageOrientationPatient`, decoded from DICOM files and written to a
+    memory mappable `.npy` file per series, with a `.json` sidecar holding
+    spacing, origin and direction in patient coordinates. Rescale slope and
+    intercept are applied when present, otherwise stored values are kept.
+    Files are read locally or from s3 by their uri; series with a file that
+    can't be read are skipped.
+    """
+    partition_key = context.asset_partition_key_for_output()
+    store_path = os.path.join(VOLUME_STORE_PATH, partition_key)
+    os.makedirs(store_path, exist_ok=True)
+
+    instances = images.select(*VOLUME_COLUMNS).toPandas()
+    instances = instances.drop_duplicates("sop_instance_uid")
+    # multi-frame objects are volumes on their own and are not stacked
+    instances = instances[pd.to_numeric(instances.number_of_frames, errors="coerce").fillna(1) <= 1]
+
+    volumes = []
+    num_failed = 0
+    for series_uid, series in instances.groupby("series_instance_uid"):
+        # slices of another shape, e.g. localizers, do not belong to the volume
+        shape = tuple(int(n) for n in series.groupby(["rows", "columns"]).size().idxmax())
+        series = series[(series["rows"] == shape[0]) & (series["columns"] == shape[1])]
+        if len(series) < config.min_slices:
+            context.log.info(f"Skipping series {series_uid} with {len(series)} slices")
+            continue
+        series, distances, direction = sort_slices(series)
+
+        # slices are decoded one at a time straight into the memory mapped volume,
+        # typed by the first slice unless values are rescaled
+        path = os.path.join(store_path, f"{series_uid}.npy")
+        try:
+            rescale = [rescale_of(filename) for filename in series.filename]
+            rescaled = any(slope != 1 or intercept != 0 for slope, intercept in rescale)
+            pixels = pixel_array(dicom_source(series.filename.iloc[0]))
+            dtype = np.float32 if rescaled else pixels.dtype
+            volume = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(len(series), *shape))
+            for i, (filename, (slope, intercept)) in enumerate(zip(series.filename, rescale)):
+                if i > 0:
+                    pixels = pixel_array(dicom_source(filename))
+                volume[i] = pixels * slope + intercept if rescaled else pixels
+            volume.flush()
+            del volume
+        except Exception as e:
+            # raw files may be gone, e.g. temporary downloads of an earlier run
+            context.log.warning(f"Skipping series {series_uid}, failed to read its files: {e}")
+            num_failed += 1
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+
+        pixel_spacing = as_vector(series.pixel_spacing.iloc[0], 2)
+        pixel_spacing = pixel_spacing if pixel_spacing is not None else np.ones(2)
+        origin = as_vector(series.image_position_patient.iloc[0], 3)
+        header = {
+            "series_instance_uid": series_uid,
+            "shape": [len(series), *shape],
+            "dtype": np.dtype(dtype).name,
+            # (slice, row, column) spacing in mm, rows are spaced by the first value of PixelSpacing
+            "spacing": [slice_spacing(series, distances), float(pixel_spacing[0]), float(pixel_spacing[1])],
+            "origin": origin.tolist() if origin is not None else None,
+            "direction": direction.tolist() if direction is not None else None,
+            "sop_instance_uids": list(series.sop_instance_uid),
+        }
+        with open(os.path.join(store_path, f"{series_uid}.json"), "w") as fp:
+            json.dump(header, fp)
+        volumes.append((
+            series_uid, f"{series_uid}.npy", *header["shape"], header["dtype"], *header["spacing"],
+            json.dumps(header["origin"])
+        ))
+
+    df = pd.DataFrame(volumes, columns=[
+        "series_instance_uid", "volume", "num_slices", "rows", "columns", "dtype",
+        "slice_spacing", "row_spacing", "column_spacing", "origin"
+    ])
+    context.add_output_metadata(
+        metadata={
+            "num_records": len(df),
+            "num_slices": int(df.num_slices.sum()),
+            "num_failed_series": num_failed,
+            "store_path": MetadataValue.path(os.path.abspath(store_path)),
+            "preview": MetadataValue.md(df.head().to_markdown())
+        }
+    )
+    return df
@@ -14,8 +14,17 @@ COLUMN_MAP = {
 	'studies': studies.columns,
 }
 
-from .devices import devices
-from .images import images
-from .patients import patients
-from .series import series
-from .studies import studies
\ No newline at end of file
+SCHEMA_MAP = {
+	'devices': devices.schema,
+	'images': images.schema,
+	'patients': patients.schema,
+	'series': series.schema,
+	'studies': studies.schema,
+}
+
+from .entities import (
+	MONTHLY_ENTITIES,
+	REFERENCE_ENTITIES,
+	monthly_entities,
+	reference_entities
+)
\ No newline at end of file
@@ -1,6 +1,18 @@
 from dagster import Config, Optional, List, PermissiveConfig
 class RawConfig(Config):
-    asset: str
-    columns: list[str]
+    # local paths or `s3://<bucket>/<key>` uris, objects on s3 are read in ranges without downloading
     files: list[str]
-    partition_column: str = None
+    # parse only requested tags and stop before `PixelData`
+    header_only: bool = True
+    # parse files in a process pool when above one, rows keep order of `files`
+    max_workers: int = 1
+    chunk_size: int = 16
+    # stream files in batches of this size as arrow record batches when above zero
+    batch_size: int = 0
+    # write sequences as arrow `list<struct>` columns instead of json strings
+    nested_sequences: bool = False
+    # first ranged GET of an s3 object, every next one is twice as large up to the max
+    s3_initial_range_kb: int = 64
+    s3_max_range_kb: int = 8192
+    # skip files recorded as ingested for the run in the ingestion ledger
+    skip_ingested: bool = False
@@ -2,6 +2,8 @@
 This module specifies the Attributes that identify and describe the piece of equipment that produced
 a Series of Composite Instances.
 """
+from .lib import entity_schema
+
 columns = [
 'DeviceSerialNumber',
 'InstitutionAddress',
@@ -13,17 +15,4 @@ columns = [
 'StationName',
 ]
 
-from .lib import *
-
-@asset(
-	auto_materialize_policy=AutoMaterializePolicy.eager(),
-    compute_kind="pandas",
-)
-def devices(
-	context: AssetExecutionContext,
-	config: RawConfig,
-)-> pd.DataFrame:
-    """
-	Devices or calibration objects (e.g., catheters, markers, baskets) from a Study and/or image.
-	"""
-    return read_dicom_file_to_df(context, config)
+schema = entity_schema(columns, dictionary=['Manufacturer'], filename=False)
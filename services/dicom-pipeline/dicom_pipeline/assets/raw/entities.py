@@ -0,0 +1,95 @@
+"""
+This module groups raw entities by their partitioning so that each group is
+extracted from DICOM files in a single pass; columns of every entity are
+declared in the corresponding modules and collected into `COLUMN_MAP`, along
+with their arrow schemas in `SCHEMA_MAP`.
+"""
+from . import COLUMN_MAP, SCHEMA_MAP
+from .lib import *
+
+MONTHLY_ENTITIES = ['images', 'series', 'studies']
+REFERENCE_ENTITIES = ['devices', 'patients']
+
+@multi_asset(
+	outs={
+		"images": AssetOut(
+			description="An image within a particular Series.",
+			metadata={"partition_expr": COLUMN_PARTITION_MAP["images"]},
+			auto_materialize_policy=AutoMaterializePolicy.eager(),
+		),
+		"series": AssetOut(
+			description="Series within a Study.",
+			metadata={"partition_expr": COLUMN_PARTITION_MAP["series"]},
+			auto_materialize_policy=AutoMaterializePolicy.eager(),
+		),
+		"studies": AssetOut(
+			description="Attributes of the Study performed upon the Patient.",
+			metadata={"partition_expr": COLUMN_PARTITION_MAP["studies"]},
+			auto_materialize_policy=AutoMaterializePolicy.eager(),
+		),
+	},
+	partitions_def=PARTITION_MONTHLY,
+	backfill_policy=BackfillPolicy.single_run(),
+	compute_kind="pandas",
+	can_subset=True,
+)
+def monthly_entities(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	dicom_file_index: DicomFileIndexResource,
+	dicom_header_cache: DicomHeaderCacheResource,
+	ingestion_ledger: IngestionLedgerResource,
+	temp_dir: TemporaryDirectoryResource,
+):
+    """
+    Entities partitioned by month, read from the same DICOM files at once;
+    files outside of the partition are dropped using the file index. Backfills
+    run as a single pass over the whole range of months.
+    """
+    yield from read_dicom_entities(
+		context,
+		config,
+		{asset: COLUMN_MAP[asset] for asset in MONTHLY_ENTITIES},
+		{asset: SCHEMA_MAP[asset] for asset in MONTHLY_ENTITIES},
+		dicom_file_index,
+		temp_dir.path.joinpath(context.run_id, "monthly_entities"),
+		dicom_header_cache,
+		ingestion_ledger
+	)
+
+@multi_asset(
+	outs={
+		"devices": AssetOut(
+			description=(
+				"Devices or calibration objects (e.g., catheters, markers, baskets) "
+				"from a Study and/or image."
+			),
+			auto_materialize_policy=AutoMaterializePolicy.eager(),
+		),
+		"patients": AssetOut(
+			description="Attiributes for a Subject of a Study.",
+			auto_materialize_policy=AutoMaterializePolicy.eager(),
+		),
+	},
+	compute_kind="pandas",
+	can_subset=True,
+)
+def reference_entities(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	dicom_header_cache: DicomHeaderCacheResource,
+	ingestion_ledger: IngestionLedgerResource,
+	temp_dir: TemporaryDirectoryResource,
+):
+    """
+    Unpartitioned entities, read from the same DICOM files at once.
+    """
+    yield from read_dicom_entities(
+		context,
+		config,
+		{asset: COLUMN_MAP[asset] for asset in REFERENCE_ENTITIES},
+		{asset: SCHEMA_MAP[asset] for asset in REFERENCE_ENTITIES},
+		spool_dir=temp_dir.path.joinpath(context.run_id, "reference_entities"),
+		header_cache=dicom_header_cache,
+		ingestion_ledger=ingestion_ledger
+	)
@@ -1,6 +1,8 @@
 """
 This module specifies the Attributes that identify and describe an image within a particular Series.
 """
+from .lib import entity_schema
+
 columns = [
 'AcquisitionDate',
 'AcquisitionDuration',
@@ -97,19 +99,4 @@ columns = [
 'WindowWidth',
 ]
 
-from .lib import *
-
-@asset(
-	metadata={"partition_expr": COLUMN_PARTITION_MAP["images"]},
-	auto_materialize_policy=AutoMaterializePolicy.eager(),
-	partitions_def=PARTITION_MONTHLY,
-	compute_kind="pandas",
-)
-def images(
-	context: AssetExecutionContext,
-	config: RawConfig,
-)-> pd.DataFrame:
-    """
-    An image within a particular Series.
-    """
-    return read_dicom_file_to_df(context, config)
+schema = entity_schema(columns)
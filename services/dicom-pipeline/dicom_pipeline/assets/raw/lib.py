@@ -2,26 +2,143 @@ from datetime import datetime
 import inflection as inf
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pydicom
-import os
+import hashlib
 import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any, Generator, Iterator, NamedTuple, Optional
 from dagster import (
 	AssetExecutionContext, 
+	AssetOut,
 	AutoMaterializePolicy,
-	AssetIn,
+	BackfillPolicy,
 	MetadataValue,
-    asset
+	Output,
+	get_dagster_logger,
+    multi_asset
 )
 from .config import RawConfig
+from ...ops.raw.s3_headers import S3RangeReader, is_s3_uri, s3_client, split_s3_uri
+from ...resources.dicom_file_index import DicomFileIndexResource
+from ...resources.dicom_header_cache import DicomHeaderCacheResource
+from ...resources.ingestion_ledger import (
+	STATUS_DONE,
+	STATUS_FAILED,
+	IngestionLedgerResource,
+	ingestion_stage
+)
+from ...resources.directory_resource import TemporaryDirectoryResource
 from ...resources.config import (
 	COLUMN_PARTITION_MAP,
 	DBT_PROJECT_NAME,
 	PARTITION_MONTHLY
 )
 
+def parse_dicom_file(
+	filepath: str,
+	plan: "ExtractionPlan",
+	header_only: bool = True,
+	s3_initial_range: int = 64 * 1024,
+	s3_max_range: int = 8 * 1024 * 1024
+) -> tuple[Optional[list], Optional[str]]:
+    """
+    Parse a single DICOM file into a row of `plan.columns` followed by file name
+    and number of bytes consumed by the parser. Objects given as `s3://` uris
+    are read in growing byte ranges instead, counting bytes fetched from S3.
+    Defined on module level to be picklable for process pools; failures are
+    returned instead of raised so one broken file does not abort the whole batch.
+    """
+    log = get_dagster_logger()
+    try:
+        if is_s3_uri(filepath):
+            bucket, key = split_s3_uri(filepath)
+            fp = S3RangeReader(s3_client(), bucket, key, s3_initial_range, s3_max_range)
+        else:
+            fp = open(filepath, 'rb')
+        with fp:
+            # header-only mode stops in front of `PixelData` and skips values of
+            # elements that are not requested, so we never load image payload
+            obj = pydicom.dcmread(
+                fp,
+                stop_before_pixels=header_only,
+                specific_tags=plan.tags if header_only else None
+            )
+            tmp = plan.extract(log, obj)
+			# Track specific dicom files we read from and how much of them
+            tmp.append(filepath)
+            tmp.append(fp.bytes_fetched if isinstance(fp, S3RangeReader) else fp.tell())
+        return tmp, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def read_dicom_headers(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	plan: "ExtractionPlan",
+	files: list[str],
+	header_cache: Optional[DicomHeaderCacheResource] = None
+) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Shared extraction stage for raw entities: every file from `files`
+    is opened with pydicom exactly once and the union of columns in `plan` is
+    collected into a single frame keyed by snake case names. Entity tables are
+    projected from that frame by `read_dicom_file_to_df`. Number of bytes
+    consumed by the parser is tracked per file in `bytes_read`.
+
+    With `config.max_workers` above one files are parsed by a process pool in
+    chunks of `config.chunk_size`; rows keep the order of `files`.
+    Files that failed to parse are skipped and returned with their errors.
+    Rows of unchanged files are taken from `header_cache` when provided, those
+    files are not opened at all and report zero `bytes_read`. Objects on S3
+    are never cached and report bytes fetched.
+    """
+    cached = header_cache.get(files, plan.cache_key) if header_cache is not None else {}
+    to_parse = [filepath for filepath in files if filepath not in cached]
+    parse = partial(
+        parse_dicom_file,
+        plan=plan,
+        header_only=config.header_only,
+        s3_initial_range=config.s3_initial_range_kb * 1024,
+        s3_max_range=config.s3_max_range_kb * 1024
+    )
+    if config.max_workers > 1:
+        with ProcessPoolExecutor(max_workers=config.max_workers) as executor:
+            parsed = list(executor.map(parse, to_parse, chunksize=config.chunk_size))
+    else:
+        parsed = list(map(parse, to_parse))
+    if header_cache is not None:
+        header_cache.put(
+            {filepath: row[:-2] for filepath, (row, _) in zip(to_parse, parsed) if row is not None},
+            plan.cache_key
+        )
+    context.log.info(f"Parsed {len(to_parse)} files, {len(cached)} read from header cache")
+
+    results = dict(zip(to_parse, parsed))
+    meta = []
+    failed = {}
+    for filepath in files:
+        row, error = (cached[filepath] + [filepath, 0], None) if filepath in cached else results[filepath]
+        if error is not None:
+            context.log.warning(f"Failed to parse {filepath}: {error}")
+            failed[filepath] = error
+            continue
+        context.log.info(filepath)
+        meta.append(row)
+    headers = pd.DataFrame(meta, columns=plan.output_names+['filename', 'bytes_read'])
+    decode_deferred_values(context.log, headers, plan.sequence_names)
+    return headers, failed
+
 def read_dicom_file_to_df(
 	context: AssetExecutionContext,
-	config: RawConfig
+	asset: str,
+	columns: list[str],
+	headers: pd.DataFrame,
+	nested_sequences: bool = False
 ) -> pd.DataFrame:
     """
     Common function that collects certain list of columns from
@@ -29,65 +146,330 @@ def read_dicom_file_to_df(
     type conversion from raw data based on description obtained from
 	pydicom. List of columns to collect depends on the underlying entity;
 	One of the: <devices, images, patients, series, studies> - columns are
-	defined in corresponding modules. Sequences are stored as pandas DataFrame.
+	defined in corresponding modules. Sequences are serialized to json strings
+	unless `nested_sequences` is set, then they are kept as lists of dicts.
     """
-    meta = []
-    for filepath in config.files:
-        context.log.info(filepath)
-        with pydicom.dcmread(filepath) as obj:
-            if config.partition_column is not None:
-                camel_partition_column = inf.camelize(config.partition_column)
-                target_date = pd.to_datetime(context.asset_partition_key_for_output())
-                file_date = pd.to_datetime(obj[camel_partition_column].value, format="%Y%m%d")
-                if file_date.month != target_date.month or file_date.year != target_date.year:
-                    continue
-			# Track specific dicom files we read from
-            tmp = []
-            for key in config.columns:
-                tmp.append(cast(context, obj.get(key, np.nan)))
-            tmp.append(filepath)
-            meta.append(tmp)
-    # snake style columns to load them to dbt
-    columns = [inf.underscore(d.replace("UID","Uid").replace('ID', 'Id')) for d in config.columns]
-	# append extra column for files
-    out_cols = columns+['filename']
-    df = pd.DataFrame(meta, columns=out_cols)
-    if config.asset in ['devices', 'patients']:
+    df = headers[[snake_case(d) for d in columns]+['filename']].copy()
+    partition_column = COLUMN_PARTITION_MAP.get(asset)
+    if partition_column is not None:
+        # time window spans every partition of the run, so a single run backfill
+        # keeps rows of all requested months and parquet writer buckets them
+        start, end = context.asset_partitions_time_window_for_output(asset)
+        file_date = pd.to_datetime(df[partition_column], format="%Y%m%d", errors="coerce")
+        df = df[(file_date >= start.replace(tzinfo=None)) & (file_date < end.replace(tzinfo=None))]
+    out_cols = list(df.columns)
+    if asset in ['devices', 'patients']:
         # drop filename column as `devices`, `patients` tables can have multiple entries
         # for now treat them as fact tables and provide source info for other tables
         df.drop(['filename'], axis=1, inplace=True)
         out_cols.pop()
-    if config.partition_column is not None:
-        df[config.partition_column] = pd.to_datetime(df[config.partition_column], format='%Y%m%d')
+    if partition_column is not None:
+        df[partition_column] = pd.to_datetime(df[partition_column], format='%Y%m%d')
 	# File indicates target type conversion we want to acheive, some values in pydicom
 	# files will have `struct[]` types which are not easily shared across DuckDB and
 	# Snowflake, so we need to do explicit conversion to `json[]` for further use in db
-    anonymization_mapping = pd.read_csv(f"{DBT_PROJECT_NAME}/seeds/anonymization_mapping.csv")
-    json_column_list = anonymization_mapping.loc[anonymization_mapping.target_type == "json[]", 'column_name'].values
+    json_column_list = json_columns() if not nested_sequences else []
     for column in df.columns:
         if column in json_column_list:
             df[column] = df[column].apply(lambda x: json.dumps(x))
-    context.add_output_metadata(
-        metadata={
-            "num_records": len(df),
-            "preview": MetadataValue.md(df.head().to_markdown())
-        }
-    )
 
     out_cols.sort()
     return df[out_cols]
 
+@lru_cache(maxsize=None)
+def json_columns() -> frozenset[str]:
+    anonymization_mapping = pd.read_csv(f"{DBT_PROJECT_NAME}/seeds/anonymization_mapping.csv")
+    return frozenset(anonymization_mapping.loc[anonymization_mapping.target_type == "json[]", 'column_name'].values)
+
+def select_partition_files(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	dicom_file_index: DicomFileIndexResource,
+	entities: list[str]
+) -> list[str]:
+    """
+    Narrow `config.files` to files whose partition dates of `entities` fall
+    into the time window of the run using persisted file index; only files
+    unseen by the index are opened to collect their dates. Objects on S3 are
+    not indexed and are all kept, their rows are filtered once read.
+    """
+    local_files = [f for f in config.files if not is_s3_uri(f)]
+    num_indexed = dicom_file_index.update(local_files)
+    start, end = context.asset_partitions_time_window_for_output(entities[0])
+    partition_columns = sorted(set(COLUMN_PARTITION_MAP[asset] for asset in entities))
+    selected = set(dicom_file_index.select(
+        local_files, partition_columns, start.replace(tzinfo=None), end.replace(tzinfo=None)
+    ))
+    files = [f for f in config.files if f in selected or is_s3_uri(f)]
+    context.log.info(
+        f"Selected {len(files)} of {len(config.files)} files for [{start}, {end}), "
+        f"newly indexed files: {num_indexed}"
+    )
+    return files
+
+def read_dicom_entities(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	column_map: dict[str, list[str]],
+	schema_map: dict[str, pa.Schema],
+	dicom_file_index: Optional[DicomFileIndexResource] = None,
+	spool_dir: Optional[Path] = None,
+	header_cache: Optional[DicomHeaderCacheResource] = None,
+	ingestion_ledger: Optional[IngestionLedgerResource] = None
+) -> Generator[Output, None, None]:
+    """
+    Single pass over DICOM files for several entities at once; the union of
+    entity columns is read per file and each selected entity is emitted as a
+    separate output of the calling multi asset, typed by `schema_map`. Partitioned entities read
+    only files picked by `dicom_file_index` when provided. With
+    `config.batch_size` above zero, entities are streamed through `spool_dir`.
+    Header rows of unchanged files are reused from `header_cache`. Files are
+    recorded in `ingestion_ledger` per asset once all outputs are stored,
+    under the monthly partition of their own rows, so single run backfills
+    and monthly runs share stages; with `config.skip_ingested` partitioned
+    entities skip files already recorded for a partition of the run.
+    Unpartitioned entities are overwritten, so they always read every file.
+    """
+    entities = [asset for asset in column_map if asset in context.selected_output_names]
+    columns = set().union(*[column_map[asset] for asset in entities])
+    if ingestion_ledger is not None:
+        # instances are identified in the ledger by their SOPInstanceUID
+        columns.add('SOPInstanceUID')
+    plan = ExtractionPlan(sorted(columns))
+    files = config.files
+    if dicom_file_index is not None:
+        files = select_partition_files(context, config, dicom_file_index, entities)
+    # files already ingested for an entity, their rows are not emitted again
+    ingested = {asset: set() for asset in entities}
+    if ingestion_ledger is not None:
+        hashes = ingestion_ledger.file_hashes(files)
+        if config.skip_ingested and context.assets_def.partitions_def is None:
+            context.log.info("Not skipping ingested files, unpartitioned entities are overwritten")
+        elif config.skip_ingested:
+            for asset in entities:
+                ingested[asset] = ingestion_ledger.done(
+                    [ingestion_stage(asset, key) for key in context.partition_keys], hashes
+                )
+            skipped = set.intersection(*ingested.values())
+            context.log.info(f"Skipping {len(skipped)} files already ingested for {', '.join(entities)}")
+            files = [f for f in files if f not in skipped]
+
+    if config.batch_size > 0:
+        sop_instance_uids, failed, file_stages = yield from stream_dicom_entities(
+            context, config, plan, column_map, schema_map, entities, files, spool_dir, header_cache, ingested
+        )
+    else:
+        headers, failed = read_dicom_headers(context, config, plan, files, header_cache)
+        file_stages = {}
+        for asset in entities:
+            df = read_dicom_file_to_df(
+                context, asset, column_map[asset], headers[~headers.filename.isin(ingested[asset])],
+                config.nested_sequences
+            )
+            bytes_read = headers.loc[df.index, 'bytes_read']
+            file_stages[asset] = ledger_stages(asset, df, headers)
+            yield Output(
+                entity_table(context, config, plan, df, schema_map[asset]),
+                output_name=asset,
+                metadata={
+                    "num_records": len(df),
+                    "bytes_read": int(bytes_read.sum()),
+                    "bytes_read_per_file": float(bytes_read.mean()) if len(df) else 0.0,
+                    "preview": MetadataValue.md(df.head().to_markdown()),
+                    "num_failed_files": len(failed),
+                    "failed_files": MetadataValue.json(failed)
+                }
+            )
+        sop_instance_uids = instance_uids(headers)
+
+    if ingestion_ledger is not None:
+        for asset in entities:
+            for stage in set(file_stages[asset].values()):
+                ingestion_ledger.record(
+                    stage,
+                    {f: hashes[f] for f, s in file_stages[asset].items() if s == stage and f in hashes},
+                    STATUS_DONE,
+                    sop_instance_uids
+                )
+            ingestion_ledger.record(
+                ledger_stage(context, asset), {f: hashes[f] for f in failed if f in hashes}, STATUS_FAILED
+            )
+
+def stream_dicom_entities(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	plan: "ExtractionPlan",
+	column_map: dict[str, list[str]],
+	schema_map: dict[str, pa.Schema],
+	entities: list[str],
+	files: list[str],
+	spool_dir: Path,
+	header_cache: Optional[DicomHeaderCacheResource] = None,
+	ingested: Optional[dict[str, set[str]]] = None
+) -> Generator[Output, None, None]:
+    """
+    Streaming variant of `read_dicom_entities`: files are read in batches of
+    `config.batch_size` and each batch of every entity is spooled to its own
+    parquet fragment under `spool_dir`, so memory is bounded by one batch. Entity
+    outputs are iterators of `pa.RecordBatch` read back fragment by fragment and
+    written incrementally by the parquet IO manager. Rows of files in
+    `ingested` of an entity are left out of it. Returns SOPInstanceUID
+    of parsed files, errors of failed ones and ledger stages of files with
+    rows in every entity.
+    """
+    ingested = ingested or {}
+    spools = {asset: RecordBatchSpool(spool_dir.joinpath(asset)) for asset in entities}
+    num_records = {asset: 0 for asset in entities}
+    bytes_read = {asset: 0 for asset in entities}
+    previews = {}
+    sop_instance_uids = {}
+    failed = {}
+    file_stages = {asset: {} for asset in entities}
+    for offset in range(0, len(files), config.batch_size):
+        headers, batch_failed = read_dicom_headers(
+            context, config, plan, files[offset:offset + config.batch_size], header_cache
+        )
+        failed.update(batch_failed)
+        sop_instance_uids.update(instance_uids(headers))
+        for asset in entities:
+            df = read_dicom_file_to_df(
+                context, asset, column_map[asset], headers[~headers.filename.isin(ingested.get(asset, set()))],
+                config.nested_sequences
+            )
+            file_stages[asset].update(ledger_stages(asset, df, headers))
+            if len(df) == 0:
+                continue
+            spools[asset].append(entity_table(context, config, plan, df, schema_map[asset]))
+            num_records[asset] += len(df)
+            bytes_read[asset] += int(headers.loc[df.index, 'bytes_read'].sum())
+            previews.setdefault(asset, df.head())
+        context.log.info(f"Spooled {min(offset + config.batch_size, len(files))} of {len(files)} files")
+
+    for asset in entities:
+        schema = schema_map[asset]
+        if config.nested_sequences:
+            # batches spooled before a sequence type was widened are cast on read,
+            # or serialized to json when the sequence fell back to strings later
+            schema = sequence_schema(schema, plan.sequence_names, plan.sequence_types)
+        yield Output(
+            spools[asset].batches(schema),
+            output_name=asset,
+            metadata={
+                "num_records": num_records[asset],
+                "num_batches": len(spools[asset]),
+                "bytes_read": bytes_read[asset],
+                "bytes_read_per_file": bytes_read[asset] / num_records[asset] if num_records[asset] else 0.0,
+                "preview": MetadataValue.md(previews[asset].to_markdown()) if asset in previews else "",
+                "num_failed_files": len(failed),
+                "failed_files": MetadataValue.json(failed)
+            }
+        )
+    return sop_instance_uids, failed, file_stages
+
+def instance_uids(headers: pd.DataFrame) -> dict[str, str]:
+    if 'sop_instance_uid' not in headers.columns:
+        return {}
+    return dict(zip(headers.filename, headers.sop_instance_uid))
+
+def ledger_stages(asset: str, df: pd.DataFrame, headers: pd.DataFrame) -> dict[str, str]:
+    """
+    Ledger stage of every file with rows in `df` of `asset`, partitioned
+    entities keep the monthly partition key of the row's partition date.
+    """
+    partition_column = COLUMN_PARTITION_MAP.get(asset)
+    if partition_column is None or 'filename' not in df.columns:
+        return {f: ingestion_stage(asset) for f in headers.filename}
+    keys = df[partition_column].dt.strftime(PARTITION_MONTHLY.fmt)
+    return {f: ingestion_stage(asset, key) for f, key in zip(df.filename, keys)}
+
+def ledger_stage(context: AssetExecutionContext, asset: str) -> str:
+    # stage of the whole run, failed files are not tied to a partition
+    if context.assets_def.partitions_def is None:
+        return ingestion_stage(asset)
+    key_range = context.partition_key_range
+    return ingestion_stage(asset, key_range.start, key_range.end)
+
+def entity_table(
+	context: AssetExecutionContext,
+	config: RawConfig,
+	plan: "ExtractionPlan",
+	df: pd.DataFrame,
+	schema: pa.Schema
+) -> pa.Table:
+    """
+    Typed table of an entity; with `config.nested_sequences` sequence
+    columns are written as arrow `list<struct>` of the type inferred for them.
+    """
+    if config.nested_sequences:
+        df, schema = nest_sequences(context.log, df, schema, plan.sequence_names, plan.sequence_types)
+    return to_arrow_table(df, schema)
+
+class RecordBatchSpool:
+    """
+    Sequence of parquet fragments holding record batches of a single entity,
+    all fragments share the entity schema. Batches are read back in `schema`
+    when given; nested columns the schema types as strings are serialized to
+    json, casting can't turn them into strings.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fragments = []
+
+    def append(self, table: pa.Table) -> None:
+        fragment = self.path.joinpath(f"part-{len(self.fragments):05d}.parquet")
+        pq.write_table(table, fragment)
+        self.fragments.append(fragment)
+
+    def __len__(self) -> int:
+        return len(self.fragments)
+
+    def __iter__(self) -> Iterator[pa.RecordBatch]:
+        return self.batches()
+
+    def batches(self, schema: Optional[pa.Schema] = None) -> Iterator[pa.RecordBatch]:
+        for fragment in self.fragments:
+            for batch in pq.ParquetFile(fragment).iter_batches():
+                if schema is not None and batch.schema != schema:
+                    table = pa.Table.from_batches([batch])
+                    for field in schema:
+                        column = table.column(field.name)
+                        if pa.types.is_string(field.type) and pa.types.is_nested(column.type):
+                            table = table.set_column(
+                                table.schema.get_field_index(field.name), field, to_json_strings(column)
+                            )
+                    batch = table.cast(schema).to_batches()[0]
+                yield batch
+
+def to_json_strings(values: pa.ChunkedArray) -> pa.Array:
+    # nested values as json strings, the way sequences falling back to strings are written
+    return pa.array([None if x is None else json.dumps(x) for x in values.to_pylist()], pa.string())
+
 __all__ = [
     'COLUMN_PARTITION_MAP',
 	'PARTITION_MONTHLY',
 	'AssetExecutionContext',
+	'AssetOut',
 	'AutoMaterializePolicy',
-	'AssetIn',
+	'BackfillPolicy',
+	'DicomFileIndexResource',
+	'DicomHeaderCacheResource',
+	'ExtractionPlan',
+	'IngestionLedgerResource',
+	'RecordBatchSpool',
 	'RawConfig',
-	'asset', 
-	'os', 
-	'pd', 
-	'read_dicom_file_to_df', 
+	'TemporaryDirectoryResource',
+	'entity_schema',
+	'entity_table',
+	'multi_asset',
+	'nest_sequences',
+	'parse_dicom_file',
+	'read_dicom_entities',
+	'read_dicom_file_to_df',
+	'read_dicom_headers',
+	'select_partition_files',
+	'stream_dicom_entities',
+	'to_arrow_table',
 ]
 
 typemap = {
@@ -99,12 +481,12 @@ typemap = {
     pydicom.uid.UID: str,
 }
 
-def cast(context: AssetExecutionContext, x):
+def cast(log: logging.Logger, x):
     if isinstance(x, pydicom.sequence.Sequence):
         dicts = []
         for ds in x:
             if isinstance(ds, pydicom.dataset.Dataset):
-                dicts.append(extract_struct(context, ds))
+                dicts.append(extract_struct(log, ds))
             else:
                 dicts.append(ds)
         return dicts
@@ -112,8 +494,9 @@ def cast(context: AssetExecutionContext, x):
 
 
 def extract_struct(
-	context: AssetExecutionContext,
-	dataset: pydicom.dataset.Dataset
+	log: logging.Logger,
+	dataset: pydicom.dataset.Dataset,
+	defer: bool = False
 ) -> dict:
     """
     Recurcively extract data from DICOM dataset and put it
@@ -128,6 +511,9 @@ def extract_struct(
     ----------
     dataset: pydicom.dataset.Dataset
         dataset to extract
+    defer: bool
+        if True, DA, TM, DT, AS values are kept as `DeferredValue`
+        to be decoded later by `decode_deferred_values`
 
     Returns
     -------
@@ -140,16 +526,17 @@ def extract_struct(
         if key == '':
             key = str(el.tag)
         if el.VR == "SQ":
-            res[key] = [extract_struct(context, val) for val in el]
+            res[key] = [extract_struct(log, val, defer) for val in el]
         else:
-            res[key] = DICOMtransform(context, el, clean=True)
+            res[key] = DICOMtransform(log, el, clean=True, defer=defer)
     return res
 
 
 def DICOMtransform(
-	context: AssetExecutionContext,
+	log: logging.Logger,
 	element: pydicom.dataelem.DataElement,
-    clean: bool = False
+    clean: bool = False,
+    defer: bool = False
 ):
     if element is None:
         return None
@@ -157,18 +544,23 @@ def DICOMtransform(
     VM = element.VM
     val = element.value
 
+    if defer and VR in TEMPORAL_VRS:
+        if VM > 1:
+            return [DeferredValue(val[i], VR, clean) for i in range(VM)]
+        return DeferredValue(val, VR, clean)
+
     try:
         if VM > 1:
-            return [decodeValue(val[i], VR, clean) for i in range(VM)]
+            return [decodeValue(log, val[i], VR, clean) for i in range(VM)]
         else:
-            return decodeValue(val, VR, clean)
+            return decodeValue(log, val, VR, clean)
 
     except Exception as e:
-        context.log.warning(f'Failed to decode value of type {VR} for: {e}')
+        log.warning(f'Failed to decode value of type {VR} for: {e}')
         return None
 
 def decodeValue(
-	context: AssetExecutionContext,
+	log: logging.Logger,
 	val,
 	VR: str,
 	clean=False
@@ -236,7 +628,7 @@ def decodeValue(
             enc = val.encodings[0]
             return val.original_string.decode(enc)
         else:
-            context.log.warning("PN: unable to get encoding")
+            log.warning("PN: unable to get encoding")
             return ""
 
     # Age string
@@ -284,11 +676,11 @@ def decodeValue(
             uts_string += "%z"
         if len(val) == 8 or \
                 (len(val) == 13 and uts_string != ""):
-            context.log.warning(f"{val}: Format is DT, but string looks like DA")
+            log.warning(f"{val}: Format is DT, but string looks like DA")
             t = datetime.strptime(val, date_string + uts_string)
         elif len(val) == 6 or \
                 (len(val) == 13 and ms_string != ""):
-            context.log.warning(f"{val}: Format is DT, but string looks like TM")
+            log.warning(f"{val}: Format is DT, but string looks like TM")
             t = datetime.strptime(val, time_string + ms_string)
         else:
             t = datetime.strptime(val, date_string + time_string + ms_string + uts_string)
@@ -304,7 +696,7 @@ def decodeValue(
     # Attributes and sequences will produce warning and return
     # None
     if VR in ("AT", "SQ", "UN"):
-        context.log.warning(f"Invalid VR: {VR}")
+        log.warning(f"Invalid VR: {VR}")
         return None
 
     # Other type
@@ -313,5 +705,326 @@ def decodeValue(
         return None
 
     # unregistered VR
-    context.log.error(f"{VR} is not valid DICOM VR")
+    log.error(f"{VR} is not valid DICOM VR")
     raise ValueError(f"invalid VR: {VR}")
+
+
+# string encoded dates, times and ages are decoded in a columnar pass after all
+# files are read, so the cost grows with the number of distinct values
+TEMPORAL_VRS = ("DA", "TM", "DT", "AS")
+
+class DeferredValue(NamedTuple):
+    value: str
+    VR: str
+    clean: bool
+
+def _parse_temporal(values: pd.Series, VR: str) -> pd.Series:
+    if VR == "DA":
+        return pd.to_datetime(values, format="%Y%m%d", errors="coerce")
+    parsed = pd.Series(pd.NaT, index=values.index)
+    fraction = values.str.contains(".", regex=False)
+    parsed[fraction] = pd.to_datetime(values[fraction], format="%H%M%S.%f", errors="coerce")
+    parsed[~fraction] = pd.to_datetime(values[~fraction], format="%H%M%S", errors="coerce")
+    return parsed
+
+def decode_temporal_values(
+	log: logging.Logger,
+	values: set[DeferredValue]
+) -> dict[DeferredValue, Any]:
+    """
+    Decode distinct deferred values: DA and TM are parsed with pandas in one
+    vectorized call per VR, DT and AS go through `decodeValue` once per value.
+    Empty values become None, undecodable ones None with a warning as in
+    `DICOMtransform`.
+    """
+    groups = {}
+    for deferred in values:
+        groups.setdefault((deferred.VR, deferred.clean), []).append(deferred)
+
+    decoded = {}
+    for (VR, clean), group in groups.items():
+        if VR in ("DA", "TM"):
+            raw = pd.Series([d.value for d in group], dtype=object)
+            for deferred, parsed in zip(group, _parse_temporal(raw, VR)):
+                if not deferred.value:
+                    decoded[deferred] = None
+                elif pd.isnull(parsed):
+                    log.warning(f'Failed to decode value of type {VR} for: {deferred.value}')
+                    decoded[deferred] = None
+                else:
+                    dt = parsed.date() if VR == "DA" else parsed.time()
+                    decoded[deferred] = dt.isoformat() if clean else dt
+        else:
+            for deferred in group:
+                try:
+                    decoded[deferred] = decodeValue(log, deferred.value, VR, clean)
+                except Exception as e:
+                    log.warning(f'Failed to decode value of type {VR} for: {e}')
+                    decoded[deferred] = None
+    return decoded
+
+def _collect_deferred(x, found: set):
+    if isinstance(x, DeferredValue):
+        found.add(x)
+    elif isinstance(x, list):
+        for item in x:
+            _collect_deferred(item, found)
+    elif isinstance(x, dict):
+        for item in x.values():
+            _collect_deferred(item, found)
+
+def _resolve_deferred(x, decoded: dict):
+    if isinstance(x, DeferredValue):
+        return decoded[x]
+    if isinstance(x, list):
+        return [_resolve_deferred(item, decoded) for item in x]
+    if isinstance(x, dict):
+        return {key: _resolve_deferred(item, decoded) for key, item in x.items()}
+    return x
+
+def decode_deferred_values(
+	log: logging.Logger,
+	df: pd.DataFrame,
+	columns: list[str]
+) -> None:
+    """
+    Replace `DeferredValue` leaves in `columns` of `df` in place with values
+    decoded by `decode_temporal_values`.
+    """
+    found = set()
+    for column in columns:
+        for x in df[column]:
+            _collect_deferred(x, found)
+    if not found:
+        return
+    decoded = decode_temporal_values(log, found)
+    for column in columns:
+        df[column] = [_resolve_deferred(x, decoded) for x in df[column]]
+
+
+@lru_cache(maxsize=None)
+def snake_case(column: str) -> str:
+    """
+    Snake style column names to load them to dbt
+    """
+    return inf.underscore(column.replace("UID","Uid").replace('ID', 'Id'))
+
+def decode_default(log: logging.Logger, x):
+    if isinstance(x, pydicom.multival.MultiValue):
+        return list(x)
+    return x
+
+def decode_float(log: logging.Logger, x):
+    if isinstance(x, (pydicom.valuerep.DSfloat, pydicom.valuerep.DSdecimal)):
+        return float(x)
+    return decode_default(log, x)
+
+def decode_int(log: logging.Logger, x):
+    if isinstance(x, pydicom.valuerep.IS):
+        return int(x)
+    return decode_default(log, x)
+
+def decode_str(log: logging.Logger, x):
+    if isinstance(x, (pydicom.valuerep.PersonName, pydicom.uid.UID)):
+        return str(x)
+    return decode_default(log, x)
+
+def decode_sequence(log: logging.Logger, x):
+    return [extract_struct(log, ds, defer=True) if isinstance(ds, pydicom.dataset.Dataset) else ds for ds in x]
+
+# decoders bound to dictionary VR of a tag, they reproduce `cast` for values of that VR
+VR_DECODERS = {
+    "DS": decode_float,
+    "IS": decode_int,
+    "PN": decode_str,
+    "UI": decode_str,
+    "SQ": decode_sequence,
+}
+
+class ExtractionPlan:
+    """
+    Extraction of `columns` compiled once per run: keywords are resolved to
+    tags, every tag is bound to a decoder of its dictionary VR and snake case
+    output names are computed upfront, so the work per file is a tight loop
+    over tags. Elements stored with VR other than in the dictionary fall back
+    to `cast`. Holds only module level functions to stay picklable.
+    """
+    def __init__(self, columns: list[str]):
+        self.columns = list(columns)
+        self.tags = []
+        for key in self.columns:
+            tag = pydicom.datadict.tag_for_keyword(key)
+            if tag is None:
+                raise ValueError(f"Unknown DICOM keyword: {key}")
+            self.tags.append(pydicom.tag.Tag(tag))
+        self.vrs = [pydicom.datadict.dictionary_VR(tag) for tag in self.tags]
+        self.decoders = [VR_DECODERS.get(vr, decode_default) for vr in self.vrs]
+        self.output_names = [snake_case(key) for key in self.columns]
+        self.sequence_names = [name for name, vr in zip(self.output_names, self.vrs) if vr == "SQ"]
+        # arrow types inferred for sequence columns during the run, widened as new items are seen
+        self.sequence_types: dict[str, pa.DataType] = {}
+        # cached rows are valid only for the same columns and parser
+        self.cache_key = hashlib.sha1(json.dumps([self.columns, pydicom.__version__]).encode()).hexdigest()
+
+    def extract(self, log: logging.Logger, obj: pydicom.dataset.Dataset) -> list:
+        row = []
+        for tag, vr, decode in zip(self.tags, self.vrs, self.decoders):
+            if tag not in obj:
+                row.append(np.nan)
+                continue
+            element = obj[tag]
+            if element.VR == vr:
+                row.append(decode(log, element.value))
+            else:
+                row.append(cast(log, element.value))
+        return row
+
+# arrow value types of numeric VRs, other VRs are kept as strings;
+# sequences are serialized to json strings by `read_dicom_file_to_df`
+VR_ARROW_TYPES = {
+    "DS": pa.float64(),
+    "FD": pa.float64(),
+    "FL": pa.float32(),
+    "IS": pa.int64(),
+    "SL": pa.int32(),
+    "SS": pa.int16(),
+    "SV": pa.int64(),
+    "UL": pa.uint32(),
+    "US": pa.uint16(),
+    "US or SS": pa.int32(),
+    "UV": pa.uint64(),
+}
+
+def arrow_type(keyword: str) -> pa.DataType:
+    """
+    Arrow type of a DICOM attribute derived from its dictionary VR and VM;
+    attributes with fixed multiplicity above one are lists, open multiplicities
+    such as `1-n` are kept scalar as in `anonymization_mapping`.
+    """
+    VR = pydicom.datadict.dictionary_VR(keyword)
+    value_type = VR_ARROW_TYPES.get(VR, pa.string())
+    # only partition columns are dates, other DA attributes stay `YYYYMMDD` strings
+    # as typed in `anonymization_mapping` and hashed into surrogate keys
+    if VR == "DA" and snake_case(keyword) in COLUMN_PARTITION_MAP.values():
+        value_type = pa.date32()
+    VM = pydicom.datadict.dictionary_VM(keyword)
+    if VM.isdigit() and int(VM) > 1:
+        return pa.list_(value_type)
+    return value_type
+
+def entity_schema(
+	columns: list[str],
+	dictionary: list[str] = [],
+	filename: bool = True
+) -> pa.Schema:
+    """
+    Explicit schema of a raw entity table, fields follow the sorted snake case
+    order of `read_dicom_file_to_df`. Low cardinality `dictionary` columns are
+    dictionary encoded.
+    """
+    fields = []
+    for column in columns:
+        dtype = arrow_type(column)
+        if column in dictionary:
+            dtype = pa.dictionary(pa.int32(), dtype)
+        fields.append(pa.field(snake_case(column), dtype))
+    if filename:
+        fields.append(pa.field('filename', pa.string()))
+    return pa.schema(sorted(fields, key=lambda field: field.name))
+
+def is_missing(x) -> bool:
+    return x is None or x is pd.NaT or (isinstance(x, float) and np.isnan(x))
+
+def is_multi_value(x) -> bool:
+    return isinstance(x, (list, tuple, pydicom.multival.MultiValue))
+
+def to_arrow_array(values: pd.Series, dtype: pa.DataType) -> pa.Array:
+    """
+    Typed array from a column of decoded values. Scalar fields receiving
+    several values keep the first number, or all strings joined with the
+    DICOM value delimiter; list fields wrap single values.
+    """
+    if len(values) == 0:
+        # columns of filtered out rows keep a numeric dtype arrow can't convert to lists
+        return pa.array([], type=dtype)
+    value_type = dtype.value_type if pa.types.is_dictionary(dtype) else dtype
+    if pa.types.is_list(value_type):
+        values = values.map(lambda x: None if is_missing(x) else list(x) if is_multi_value(x) else [x])
+        return pa.array(values, type=dtype, from_pandas=True)
+    if pa.types.is_date(value_type):
+        values = pd.to_datetime(values, format="%Y%m%d", errors="coerce")
+        return pa.array(values, from_pandas=True).cast(dtype)
+    if pa.types.is_integer(value_type) or pa.types.is_floating(value_type):
+        values = pd.to_numeric(values.map(lambda x: x[0] if is_multi_value(x) and len(x) else x), errors="coerce")
+        return pa.array(values, from_pandas=True).cast(dtype)
+    values = values.map(
+        lambda x: None if is_missing(x) else "\\".join(map(str, x)) if is_multi_value(x) else str(x)
+    )
+    return pa.array(values, type=dtype, from_pandas=True)
+
+def to_arrow_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """
+    Build entity table column by column into arrays of `schema` types,
+    so no type inference happens on write.
+    """
+    return pa.Table.from_arrays(
+        [to_arrow_array(df[field.name], field.type) for field in schema],
+        schema=schema
+    )
+
+def sequence_arrow_type(
+	log: logging.Logger,
+	column: str,
+	values: pd.Series,
+	sequence_types: dict[str, pa.DataType]
+) -> pa.DataType:
+    """
+    Infer `list<struct>` type of a sequence column from its items and merge it
+    with the type cached for the column in `sequence_types`; sequences not
+    representable as `list<struct>` fall back to json strings.
+    """
+    cached = sequence_types.get(column, pa.null())
+    if pa.types.is_string(cached):
+        return cached
+    try:
+        inferred = pa.array([x for x in values if not is_missing(x)]).type
+        dtype = pa.unify_schemas(
+            [pa.schema([pa.field(column, cached)]), pa.schema([pa.field(column, inferred)])],
+            promote_options="permissive"
+        ).field(column).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        log.warning(f"Sequence `{column}` is stored as json, type can not be inferred: {e}")
+        dtype = pa.string()
+    sequence_types[column] = dtype
+    return dtype
+
+def sequence_schema(
+	schema: pa.Schema,
+	sequence_names: list[str],
+	sequence_types: dict[str, pa.DataType]
+) -> pa.Schema:
+    """
+    Entity schema with sequence columns set to their types in `sequence_types`.
+    """
+    for i, field in enumerate(schema):
+        if field.name in sequence_names and field.name in sequence_types:
+            schema = schema.set(i, field.with_type(sequence_types[field.name]))
+    return schema
+
+def nest_sequences(
+	log: logging.Logger,
+	df: pd.DataFrame,
+	schema: pa.Schema,
+	sequence_names: list[str],
+	sequence_types: dict[str, pa.DataType]
+) -> tuple[pd.DataFrame, pa.Schema]:
+    """
+    Resolve types of sequence columns in `df` and return the entity schema
+    with those types; columns falling back to strings are serialized to json.
+    """
+    for field in schema:
+        if field.name not in sequence_names:
+            continue
+        if pa.types.is_string(sequence_arrow_type(log, field.name, df[field.name], sequence_types)):
+            df[field.name] = df[field.name].apply(lambda x: json.dumps(x))
+    return df, sequence_schema(schema, sequence_names, sequence_types)
@@ -4,6 +4,8 @@ who is the subject of a Study. This Module contains Attributes of the Patient th
 for interpretation of the Composite Instances and are common for all Studies performed on the
 Patient. It contains Attributes that are also included in the Patient Modules in Section C.2.
 """
+from .lib import entity_schema
+
 
 columns = [
 'Allergies',
@@ -34,17 +36,4 @@ columns = [
 'SpecialNeeds',
 ]
 
-from .lib import *
-
-@asset(
-	auto_materialize_policy=AutoMaterializePolicy.eager(),
-	compute_kind="pandas",
-)
-def patients(
-	context: AssetExecutionContext,
-	config: RawConfig,
-)-> pd.DataFrame:
-    """
-    Attiributes for a Subject of a Study.
-    """
-    return read_dicom_file_to_df(context, config)
+schema = entity_schema(columns, dictionary=['PatientSex'], filename=False)
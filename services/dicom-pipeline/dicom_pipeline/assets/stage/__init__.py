@@ -1 +1,2 @@
-from .compressed_images import compressed_images
\ No newline at end of file
+from .compressed_images import compressed_images
+from .image_arrays import image_arrays
@@ -12,9 +12,11 @@ from dagster import (
 	String,
 	asset
 )
-from dagster_aws.s3 import S3FileManagerResource
+from dagster_aws.s3 import S3FileManagerResource, S3Resource
+from ...ops.raw.pixel_data import compressed_image_key, thumbnail_key
+from ...ops.utils import head_s3_objects, tuned_s3_client
 from ...resources import TemporaryDirectoryResource
-from ...resources.config import PARTITION_MONTHLY
+from ...resources.config import PARTITION_MONTHLY, S3_LIST_MAX_WORKERS, THUMBNAIL_SIZES
 
 @asset(
 	ins={"images": AssetIn(key_prefix="raw"),
@@ -26,6 +28,8 @@ from ...resources.config import PARTITION_MONTHLY
 def compressed_images(
 	context: AssetExecutionContext,
 	s3_io_raw: S3FileManagerResource,
+	s3_io_stage: S3FileManagerResource,
+	s3_stage: S3Resource,
 	temp_dir: TemporaryDirectoryResource,
 	images: SparkDF,
 	lambda_image_keys: List[String],
@@ -43,9 +47,13 @@ def compressed_images(
     target_date = pd.to_datetime(context.asset_partition_key_for_output())
     target_part = target_date.strftime("%Y/%m/")
 
+    instances = images.select(
+        "series_instance_uid", "sop_instance_uid", "instance_creation_date"
+    ).toPandas().drop_duplicates(["series_instance_uid", "sop_instance_uid"])
+
     # unique identifier collected from s3 after lambda function
     # custom merge key is defined in ./services/img-compressor
-    s3_keys = target_part + images.series_instance_uid + '|' + images.sop_instance_uid + ".jpeg"
+    s3_keys = target_part + instances.series_instance_uid + '|' + instances.sop_instance_uid + ".jpeg"
 
 	# download files to temp directory
     for key in s3_keys:
@@ -60,24 +68,44 @@ def compressed_images(
         pulled_files.append(file_name)
 
 	# combine downloaded images to dataframe
-    images = [ plt.imread(f) for f in pulled_files ]
+    image_data = [ plt.imread(f) for f in pulled_files ]
 	# same unique identifier, we split it to columns to perform joins downstream
     files = [ x.split("/")[-1].replace(".jpeg", "") for x in s3_keys ]
     series_uids, sop_uids= map(list, zip(*(s.split('|') for s in files)))
 	# clean-up files; images are moved with DataFrame
     for f in pulled_files:
         os.remove(f)
-    df = pd.Dataframe({
-		"image_data": images,
+    df = pd.DataFrame({
+		"image_data": image_data,
 		"image_filename": files,
 		"series_instance_uid": series_uids,
 		"sop_instance_uid": sop_uids,
 	})
+	# thumbnails are stored next to images by the python backend only, so keys are
+	# derived the way the compressor writes them and kept only for existing objects
+    creation_dates = pd.to_datetime(instances.instance_creation_date).dt.strftime("%Y%m%d")
+    image_keys = [
+        compressed_image_key(s3_io_stage.s3_prefix, series_uid, sop_uid, creation_date)
+        for series_uid, sop_uid, creation_date in zip(
+            instances.series_instance_uid, instances.sop_instance_uid, creation_dates
+        )
+    ]
+    thumbnail_keys = {size: [thumbnail_key(key, size) for key in image_keys] for size in THUMBNAIL_SIZES}
+    written = head_s3_objects(
+        tuned_s3_client(s3_stage, S3_LIST_MAX_WORKERS),
+        s3_io_stage.s3_bucket,
+        [key for keys in thumbnail_keys.values() for key in keys],
+        S3_LIST_MAX_WORKERS
+    )
+    for size, keys in thumbnail_keys.items():
+        df[f"thumbnail_{size}_key"] = [key if written[key] is not None else None for key in keys]
 
     context.add_output_metadata(
         metadata={
             "num_records": len(df),
-            "preview": MetadataValue.md(df.head().to_markdown())
+            "thumbnail_sizes": MetadataValue.json(THUMBNAIL_SIZES),
+            "num_thumbnails": sum(response is not None for response in written.values()),
+            "preview": MetadataValue.md(df.drop(columns="image_data").head().to_markdown())
         }
     )
     return df
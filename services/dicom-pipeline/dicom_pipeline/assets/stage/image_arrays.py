@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+from pyspark.sql import DataFrame as SparkDF
+from PIL import Image
+import io
+import os
+import numpy as np
+import pandas as pd
+from dagster import (
+	AssetExecutionContext,
+	AssetIn,
+	AutoMaterializePolicy,
+	List,
+	MetadataValue,
+	String,
+	asset
+)
+from dagster_aws.s3 import S3FileManagerResource, S3Resource
+from ...ops.raw.pixel_data import compressed_image_key, thumbnail_key
+from ...resources.config import (
+	IMAGE_STORE_PATH,
+	PARTITION_MONTHLY,
+	THUMBNAIL_SIZES,
+	ImageStoreConfig
+)
+
+
+def letterbox(image: Image.Image, size: int) -> np.ndarray:
+    """
+    Fit `image` into a `size` x `size` grayscale array keeping aspect ratio,
+    the rest is padded with zeros.
+    """
+    image = image.convert("L")
+    if max(image.size) != size:
+        scale = size / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.Resampling.LANCZOS
+        )
+    array = np.zeros((size, size), dtype=np.uint8)
+    array[:image.height, :image.width] = np.asarray(image)
+    return array
+
+
+def load_image_shard(store_path: str, shard: str) -> np.ndarray:
+    """
+    Memory map a shard of the image store read only; slicing a row of the
+    index' `offset` reads only that image from disk.
+    """
+    return np.load(os.path.join(store_path, shard), mmap_mode="r")
+
+
+@asset(
+	ins={"images": AssetIn(key_prefix="raw"),
+	     "lambda_image_keys": AssetIn(key_prefix="operational")},
+	auto_materialize_policy=AutoMaterializePolicy.eager(),
+    partitions_def=PARTITION_MONTHLY,
+    compute_kind="numpy",
+)
+def image_arrays(
+	context: AssetExecutionContext,
+	config: ImageStoreConfig,
+	s3_io_stage: S3FileManagerResource,
+	s3_stage: S3Resource,
+	images: SparkDF,
+	lambda_image_keys: List[String],
+) -> pd.DataFrame:
+    """
+    Decoded compressed images of the partition in a memory mappable store of
+    `.npy` shards with fixed image shape, grouped per series; returns the index
+    from (series_instance_uid, sop_instance_uid) to shard and offset, which is
+    also stored next to shards as `index.parquet`. Thumbnails are read instead
+    of full images when a level of `config.image_size` exists, the full image
+    is read when its thumbnail was not written.
+    """
+    partition_key = context.asset_partition_key_for_output()
+    store_path = os.path.join(IMAGE_STORE_PATH, partition_key)
+    size = config.image_size
+
+    instances = images.select(
+        "series_instance_uid", "sop_instance_uid", "instance_creation_date"
+    ).toPandas().drop_duplicates(["series_instance_uid", "sop_instance_uid"])
+    creation_dates = pd.to_datetime(instances.instance_creation_date).dt.strftime("%Y%m%d")
+    keys = [
+        compressed_image_key(s3_io_stage.s3_prefix, series_uid, sop_uid, creation_date)
+        for series_uid, sop_uid, creation_date in zip(
+            instances.series_instance_uid, instances.sop_instance_uid, creation_dates
+        )
+    ]
+    instances["key"] = keys
+    instances = instances.sort_values(["series_instance_uid", "sop_instance_uid"], ignore_index=True)
+
+    client = s3_stage.get_client()
+
+    def get_image(key):
+        if size in THUMBNAIL_SIZES:
+            # only the python backend writes thumbnails
+            try:
+                return client.get_object(Bucket=s3_io_stage.s3_bucket, Key=thumbnail_key(key, size))["Body"].read()
+            except client.exceptions.NoSuchKey:
+                pass
+        return client.get_object(Bucket=s3_io_stage.s3_bucket, Key=key)["Body"].read()
+
+    def read_image(key):
+        try:
+            body = get_image(key)
+            with Image.open(io.BytesIO(body)) as image:
+                return letterbox(image, size), image.height, image.width
+        except Exception as e:
+            context.log.warning(f"Skipping image {key}: {e}")
+            return None
+
+    index = []
+    with ThreadPoolExecutor(max_workers=config.max_workers) as pool:
+        for series_uid, series in instances.groupby("series_instance_uid", sort=False):
+            series_path = os.path.join(store_path, series_uid)
+            os.makedirs(series_path, exist_ok=True)
+            for start in range(0, len(series), config.shard_size):
+                chunk = series.iloc[start:start + config.shard_size]
+                decoded = [
+                    (sop_uid, image) for sop_uid, image in
+                    zip(chunk.sop_instance_uid, pool.map(read_image, chunk.key)) if image is not None
+                ]
+                if not decoded:
+                    continue
+                shard = os.path.join(series_uid, f"shard-{start // config.shard_size:05d}.npy")
+                array = np.lib.format.open_memmap(
+                    os.path.join(store_path, shard), mode="w+", dtype=np.uint8, shape=(len(decoded), size, size)
+                )
+                for offset, (sop_uid, (pixels, height, width)) in enumerate(decoded):
+                    array[offset] = pixels
+                    index.append((series_uid, sop_uid, shard, offset, height, width))
+                array.flush()
+                del array
+
+    df = pd.DataFrame(
+        index,
+        columns=["series_instance_uid", "sop_instance_uid", "shard", "offset", "height", "width"]
+    )
+    os.makedirs(store_path, exist_ok=True)
+    df.to_parquet(os.path.join(store_path, "index.parquet"), index=False)
+
+    context.add_output_metadata(
+        metadata={
+            "num_records": len(df),
+            "num_missing": len(instances) - len(df),
+            "num_shards": int(df.shard.nunique()),
+            "image_shape": MetadataValue.json([size, size]),
+            "store_path": MetadataValue.path(os.path.abspath(store_path)),
+            "preview": MetadataValue.md(df.head().to_markdown())
+        }
+    )
+    return df
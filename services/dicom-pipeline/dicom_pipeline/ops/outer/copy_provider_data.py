@@ -1,12 +1,18 @@
+import json
 from dagster import (
 	In,
+	MetadataValue,
 	OpExecutionContext,
 	Out,
 	List,
 	String,
 	op
 )
+from boto3.s3.transfer import TransferConfig
 from dagster_aws.s3 import S3FileManagerResource, S3Resource
+from ...ops.utils import copy_s3_objects, head_s3_objects, tuned_s3_client
+from ...resources.config import CopyConfig
+from ...resources.ingestion_ledger import IngestionLedgerResource
 
 @op(
     name="copy_provider_data",
@@ -19,19 +25,49 @@ from dagster_aws.s3 import S3FileManagerResource, S3Resource
 )
 def s3_copy_provider_data(
     context: OpExecutionContext,
+	config: CopyConfig,
 	s3_provider: S3Resource,
 	s3_provider_io: S3FileManagerResource,
 	s3_io_raw: S3FileManagerResource,
+	ingestion_ledger: IngestionLedgerResource,
 	provider_s3_keys: List[String]
 ) -> List[String]:
-    copy_sources = [{ 'Bucket': s3_provider_io.s3_bucket,
-		              'Key': key } for key in provider_s3_keys]
+    """
+	Server side copy of provider objects to own raw bucket with one client
+	shared by a pool of requests, large objects are copied in parts
+	concurrently; objects already copied with the same ETag are skipped
+	"""
+    client = tuned_s3_client(s3_provider, config.max_concurrency)
+    sources = head_s3_objects(client, s3_provider_io.s3_bucket, provider_s3_keys, config.max_concurrency)
+    missing = [key for key, source in sources.items() if source is None]
+    if missing:
+        context.log.warning(f"Skipping {len(missing)} keys missing in provider bucket")
+    etags = {key: source['ETag'] for key, source in sources.items() if source is not None}
+    new_keys = ingestion_ledger.pending(context.op_def.name, etags)
+    context.log.info(f"Skipping {len(etags) - len(new_keys)} files already copied")
 
-    s3_keys = []
-	# copy each file to own bucket
-    for source in copy_sources:
-        # we preserve source key of unknown form a/b/c/key.dicom; change later, once relevant
-        s3_keys.append(source['Key'])
-        s3_provider.get_client().meta.client.copy(source, s3_io_raw.s3_bucket, source['Key'])
-        context.log.info(f"Successful transfer for s3://{s3_io_raw.s3_bucket}/{source['Key']}")
+    # we preserve source key of unknown form a/b/c/key.dicom; change later, once relevant
+    transfer_config = TransferConfig(
+        multipart_threshold=config.multipart_threshold_mb * 1024 * 1024,
+        multipart_chunksize=config.multipart_chunksize_mb * 1024 * 1024,
+        max_concurrency=config.max_concurrency,
+    )
+    results, stats = copy_s3_objects(
+        context,
+        client,
+        s3_provider_io.s3_bucket,
+        {key: sources[key] for key in new_keys},
+        s3_io_raw.s3_bucket,
+        transfer_config
+    )
+    s3_keys = [key for key, result in results.items() if result['status'] != 'failed']
+    ingestion_ledger.record(context.op_def.name, {key: etags[key] for key in s3_keys})
+    context.log.info(f"Copied {len(s3_keys)} files to s3://{s3_io_raw.s3_bucket}: {stats}")
+    context.add_output_metadata(
+        metadata={
+            "num_new_s3_keys": len(s3_keys),
+            **stats,
+            "results": MetadataValue.json(json.dumps(dict(list(results.items())[:100])))
+        }
+    )
     return s3_keys
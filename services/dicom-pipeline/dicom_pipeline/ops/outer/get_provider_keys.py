@@ -9,8 +9,11 @@ from dagster import (
 	op
 )
 from dagster_aws.s3 import S3FileManagerResource, S3Resource
-from ...ops.utils import retrieve_s3_keys
+from .copy_provider_data import s3_copy_provider_data
+from ...ops.utils import discover_s3_keys
 from ...resources.config import PartitionConfig
+from ...resources.ingestion_ledger import IngestionLedgerResource
+from ...resources.s3_inventory import S3InventoryResource
 
 @op(
 	name="get_provider_keys",
@@ -25,10 +28,21 @@ def s3_get_provider_keys(
 	config: Optional[PartitionConfig],
 	s3_provider: S3Resource,
 	s3_provider_io: S3FileManagerResource,
+	s3_provider_inventory: S3InventoryResource,
+	ingestion_ledger: IngestionLedgerResource,
 	provider_s3_keys: List[String]
 ) -> List[String]:
     context.log.info(f"Successfully processed provider keys: {provider_s3_keys}")
-    target_keys = retrieve_s3_keys(context, config, s3_provider, s3_provider_io)
+    # keys already copied with the same content are not handed to the copy again
+    target_keys = list(discover_s3_keys(
+        context,
+        config,
+        s3_provider,
+        s3_provider_io,
+        s3_provider_inventory,
+        ingestion_ledger,
+        s3_copy_provider_data.name
+    ))
     context.log.info(f"Found provider files: {target_keys}")
     context.add_output_metadata(
         metadata={
@@ -1,15 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import json
+import math
+import os
+import shutil
 import subprocess
+import pandas as pd
 from dagster import (
+    DagsterError,
     In,
 	Int,
+	MetadataValue,
 	OpExecutionContext,
 	Out,
 	List,
 	String,
 	op
 )
-from dagster_aws.s3 import S3FileManagerResource
+from dagster_aws.s3 import S3FileManagerResource, S3Resource
+from ...ops.utils import (
+	balance_by_size,
+	fan_out_lambda,
+	head_s3_objects,
+	parse_compressor_results,
+	tuned_s3_client,
+	write_shard_manifests
+)
+from .pixel_data import compress_dicom_files
+from ...resources import TemporaryDirectoryResource
+from ...resources.config import S3_LIST_MAX_WORKERS, CompressConfig
+from ...resources.ingestion_ledger import STATUS_DONE, STATUS_FAILED, IngestionLedgerResource
 from ...resources.lambda_resource import LambdaResource, LambdaConfig
 
 @op(
@@ -25,15 +45,19 @@ def lambda_compress_pixel_data(
     context: OpExecutionContext,
 	config: LambdaConfig,
 	lambda_client: LambdaResource,
+	s3_raw: S3Resource,
+	s3_stage: S3Resource,
 	s3_io_raw: S3FileManagerResource,
 	s3_io_stage: S3FileManagerResource,
     s3_keys: List[String],
 ) -> Int:
     """
-    Launch a cloud lambda function to compress raw pixel data and push resulting image to S3. 
-	Implementation can be found in `./services/img-compressor/`;
+    Launch cloud lambda functions to compress raw pixel data and push resulting images to S3.
+	Keys are split into shards balanced by object size, every shard manifest is put to
+	the `stage` bucket and handled by a separate asynchronous invocation; functions
+	write per file results next to manifests. Implementation can be found in
+	`./services/img-compressor/`;
 	"""
-    context.log.info(f"Submitting lambda request for: {config.function_name} - {config.qualifier} for file: {s3_keys}")
     payload = {
 		# source s3 with raw dicom files
 		'source_bucket': s3_io_raw.s3_bucket,
@@ -41,34 +65,81 @@ def lambda_compress_pixel_data(
 		# destination s3 details to write compressed images to
 		'target_bucket': s3_io_stage.s3_bucket,
 		'target_prefix': s3_io_stage.s3_prefix,
-		# list of dicom files from source bucket to process
-		'files': s3_keys
 	}
-    response = lambda_client.invoke(
-		FunctionName=config.function_name,
-		InvocationType=config.invocation_type,
-		Payload=json.dumps(payload),
-		qualifier=config.qualifier
-	)
-    return response["result"]
+    # only the given keys are looked up, the raw prefix holds the whole history
+    responses = head_s3_objects(
+        tuned_s3_client(s3_raw, S3_LIST_MAX_WORKERS), s3_io_raw.s3_bucket, s3_keys, S3_LIST_MAX_WORKERS
+    )
+    sizes = {key: response["ContentLength"] if response else 0 for key, response in responses.items()}
+    num_shards = max(
+        math.ceil(sum(sizes.values()) / (config.shard_size_mb * 1024 * 1024)),
+        math.ceil(len(sizes) / config.max_shard_files),
+    )
+    shards = balance_by_size(sizes, num_shards)
+
+    s3_client = s3_stage.get_client()
+    manifests = write_shard_manifests(
+        s3_client,
+        s3_io_stage.s3_bucket,
+        f"{s3_io_stage.s3_prefix}/lambda_manifests/{context.run_id}",
+        payload,
+        shards
+    )
+    context.log.info(
+        f"Submitting {len(manifests)} lambda requests for: {config.function_name} - {config.qualifier} "
+        f"for {len(s3_keys)} files, {config.max_concurrency} at once"
+    )
+    results = fan_out_lambda(
+        context,
+        lambda_client.get_client(),
+        s3_client,
+        config.function_name,
+        config.qualifier,
+        manifests,
+        config.max_concurrency,
+        config.poll_interval_s,
+        config.timeout_s
+    )
+
+    status = pd.DataFrame(list(results.values()), columns=["file", "status", "key", "error"])
+    num_compressed = int((status.status == "ok").sum())
+    context.add_output_metadata(
+        metadata={
+            "num_compressed": num_compressed,
+            "num_failed": len(status) - num_compressed,
+            "num_shards": len(manifests),
+            "status": MetadataValue.md(status.to_markdown()),
+        }
+    )
+    return num_compressed
 
 @op(
     name="compress_pixel_data",
     description=(
-        "Launch a subprocess to compress scan data from local DICOM scans. "
-        "s3 bucket. Images will be stored as JPEG for further use in ML tasks."
-	    "Binary will compress images and push them to S3. Implementation details"
-		"Can be found in crate `./services/img-compressor/`;"
+        "Compress scan data from local DICOM scans by a pool of `img-compressor` subprocesses, "
+        "or by a pool of python processes when the binary is not available. "
+        "Images will be stored as JPEG for further use in ML tasks and pushed to S3. "
+		"Implementation details of the binary can be found in crate `./services/img-compressor/`;"
     ),
 	ins={"raw_files": In(description="List of raw dicom file names stored locally to process")},
     out={"status": Out(description="Number of converted images as response from a binary run")},
 )
 def compress_pixel_data(
     context: OpExecutionContext,
+	config: CompressConfig,
 	s3_io_raw: S3FileManagerResource,
 	s3_io_stage: S3FileManagerResource,
+	s3_stage: S3Resource,
+	temp_dir: TemporaryDirectoryResource,
+	ingestion_ledger: IngestionLedgerResource,
 	raw_files: List[String],
 ) -> Int:
+    """
+    Compress local files with the backend from `config.backend`; `auto` runs
+    `img-compressor` when the binary is on PATH and the python backend otherwise.
+    Both backends put images under the same keys and report per file status,
+    which is recorded in `ingestion_ledger` so sensors hand over only new files.
+	"""
     _compress_config = {
 		# source s3 with raw dicom files
 		'source_bucket': s3_io_raw.s3_bucket,
@@ -77,25 +148,126 @@ def compress_pixel_data(
 		'target_bucket': s3_io_stage.s3_bucket,
 		'target_prefix': s3_io_stage.s3_prefix,
 	}
-    status = 0
-    offset = 0
-    FILE_LIMIT = 2500
-	# bash has limit for arguments defined by ARGMAX
-    # limit number of files provided to binary to not overflow
-    args =  [x.split("/")[-1] for x in raw_files]
-    for i in range(0, len(args), FILE_LIMIT-1):
-        if i % 2500:
-            cmd_str='img-compressor '
-            for filename in args[offset:offset + FILE_LIMIT]:
-                cmd_str += filename + ' '
-            sb = subprocess.run(
-                cmd_str,
-                capture_output=True,
-                shell=True
-            )
-            context.log.info(sb)
-            offset += FILE_LIMIT
-            if sb.returncode == 0:
-                status += FILE_LIMIT
+    sizes = {}
+    results = {}
+    for filename in raw_files:
+        if os.path.isfile(filename):
+            sizes[filename] = os.path.getsize(filename)
+        else:
+            results[filename] = {"file": filename, "status": "error", "error": "file not found"}
+
+    backend = config.backend
+    if backend == "auto":
+        backend = "rust" if shutil.which(config.binary) else "python"
+    workdir = temp_dir.path.joinpath(context.run_id, "compress_pixel_data")
+    workdir.mkdir(parents=True, exist_ok=True)
+    context.log.info(f"Compressing {len(sizes)} files with {backend} backend")
+    if backend == "rust":
+        results.update(run_img_compressor(context, config, _compress_config, sizes, workdir))
+    elif backend == "python":
+        results.update(run_python_compressor(context, config, _compress_config, list(sizes), workdir, s3_stage))
+    else:
+        raise DagsterError(f"Unknown compression backend: {config.backend}")
+
+    status = pd.DataFrame(list(results.values()), columns=["file", "status", "key", "frames", "thumbnails", "mode", "error"])
+    num_compressed = int((status.status == "ok").sum())
+    hashes = ingestion_ledger.file_hashes(list(sizes))
+    for result_status, ledger_status in (("ok", STATUS_DONE), ("error", STATUS_FAILED)):
+        files = status.file[status.status == result_status]
+        ingestion_ledger.record(context.op_def.name, {f: hashes[f] for f in files if f in hashes}, ledger_status)
+    context.add_output_metadata(
+        metadata={
+            "backend": backend,
+            "num_compressed": num_compressed,
+            "num_failed": len(status) - num_compressed,
+            # images copied from already compressed pixel data without decoding
+            "num_passthrough": int((status["mode"] == "passthrough").sum()),
+            "num_frames": int(status.frames.fillna(1)[status.status == "ok"].sum()),
+            "num_thumbnails": int(status.thumbnails.fillna(0).sum()),
+            "thumbnail_sizes": MetadataValue.json(config.thumbnail_sizes if backend == "python" else []),
+            "status": MetadataValue.md(status.to_markdown()),
+        }
+    )
+    return num_compressed
+
+def run_img_compressor(
+	context: OpExecutionContext,
+	config: CompressConfig,
+	compress_config: dict,
+	sizes: dict[str, int],
+	workdir: Path
+) -> dict[str, dict]:
+    """
+    Run up to `config.max_workers` `img-compressor` processes at once, each one
+    reads its share of files from a json manifest, so the number of files is
+    not limited by ARG_MAX. Shares are balanced by file size and every process
+    prints one json line with the status of each file it handled.
+    """
+    workers = []
+    for i, shard in enumerate(balance_by_size(sizes, config.max_workers)):
+        manifest = workdir.joinpath(f"manifest-{i:03d}.json")
+        manifest.write_text(json.dumps({**compress_config, 'files': shard}))
+        # results go to files rather than pipes, so a worker never blocks on a full pipe
+        stdout = open(workdir.joinpath(f"results-{i:03d}.jsonl"), "w")
+        stderr = open(workdir.joinpath(f"log-{i:03d}.txt"), "w")
+        process = subprocess.Popen([config.binary, "--manifest", str(manifest)], stdout=stdout, stderr=stderr)
+        workers.append((shard, process, stdout, stderr))
+        context.log.info(f"Started worker {i} for {len(shard)} files, {sum(sizes[f] for f in shard)} bytes")
+
+    results = {}
+    for shard, process, stdout, stderr in workers:
+        returncode = process.wait()
+        stdout.close()
+        stderr.close()
+        with open(stdout.name) as fp:
+            shard_results = parse_compressor_results(fp)
+        for filename in shard:
+            results[filename] = shard_results.get(filename, {
+                "file": filename,
+                "status": "error",
+                "error": f"no result, worker exited with {returncode}, see {stderr.name}"
+            })
+    return results
+
+def run_python_compressor(
+	context: OpExecutionContext,
+	config: CompressConfig,
+	compress_config: dict,
+	files: list[str],
+	workdir: Path,
+	s3_stage: S3Resource
+) -> dict[str, dict]:
+    """
+    Encode files across a pool of `config.max_workers` processes and upload
+    resulting images to the target bucket from a pool of threads.
+    """
+    encoded = compress_dicom_files(
+        files,
+        str(workdir.joinpath("images")),
+        compress_config['target_prefix'],
+        config.max_workers,
+        config.image_format,
+        config.quality,
+        config.stream_frames,
+        config.thumbnail_sizes
+    )
+    client = s3_stage.get_client()
+
+    def upload(result):
+        if result["status"] != "ok":
+            return result
+        outputs = result.pop("outputs")
+        try:
+            for path, key in outputs:
+                client.upload_file(path, compress_config['target_bucket'], key)
+        except Exception as e:
+            result = {"file": result["file"], "status": "error", "error": f"upload failed: {e}"}
+        finally:
+            for path, _ in outputs:
+                os.remove(path)
+        return result
 
-    return status
+    with ThreadPoolExecutor(max_workers=config.max_workers) as pool:
+        uploaded = list(pool.map(upload, encoded))
+    context.log.info(f"Uploaded {sum(r['status'] == 'ok' for r in uploaded)} images")
+    return {result["file"]: result for result in uploaded}
@@ -1,4 +1,5 @@
 import json
+from pathlib import Path
 from dagster import (
 	In,
 	List,
@@ -8,10 +9,10 @@ from dagster import (
 	String,
 	op
 )
+from boto3.s3.transfer import TransferConfig
 from dagster_aws.s3 import S3FileManagerResource, S3Resource
-from ...ops.utils import retrieve_s3_keys
-from ...resources import TemporaryDirectoryResource
-from ...resources.config import PartitionConfig
+from ...ops.utils import download_s3_objects
+from ...resources.config import DownloadConfig
 
 @op(
     name="s3_get_raw_files",
@@ -24,34 +25,39 @@ from ...resources.config import PartitionConfig
 )
 def s3_get_raw_files(
     context: OpExecutionContext,
-	config: PartitionConfig,
+	config: DownloadConfig,
 	s3_raw: S3Resource,
 	s3_io_raw: S3FileManagerResource,
-	temp_dir: TemporaryDirectoryResource,
 	s3_keys: List[String]
 ) -> List[String]:
     """
-	Operation to crawl new dicom file arrivals from s3 to local filesystem
+	Operation to crawl new dicom file arrivals from s3 to local filesystem;
+	objects are fetched concurrently with ranged GETs, files already present
+	are skipped and interrupted downloads are resumed; files are kept in
+	the configured directory, so partial downloads survive to a retry
 	"""
-    target_keys = retrieve_s3_keys(context, config, s3_raw, s3_io_raw)
-    context.log.info(f"Found provider files: {target_keys}")
-    temp_dir.create_dir()
-    raw_files = []
-    for key in s3_keys:
-        context.log.info(f"Downloading {key} from {s3_io_raw.s3_bucket}/{s3_io_raw.s3_prefix}")
-        temp_dir.path.joinpath(key).parent.mkdir(parents=True, exist_ok=True)
-        file_name = temp_dir.path.joinpath(key)
-        raw_files.append(file_name)
-        s3_io_raw.download_file(
-            Bucket=s3_io_raw.s3_bucket,
-            Key=key,
-            Filename=file_name,
-        )
-        context.log.info(f"Writing to {file_name}")
+    directory = Path(config.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    transfer_config = TransferConfig(
+        multipart_threshold=config.multipart_threshold_mb * 1024 * 1024,
+        multipart_chunksize=config.multipart_chunksize_mb * 1024 * 1024,
+        max_concurrency=config.max_concurrency,
+    )
+    context.log.info(f"Downloading {len(s3_keys)} files from {s3_io_raw.s3_bucket}/{s3_io_raw.s3_prefix}")
+    raw_files, stats = download_s3_objects(
+        context,
+        s3_raw.get_client(),
+        s3_io_raw.s3_bucket,
+        s3_keys,
+        directory,
+        transfer_config
+    )
+    context.log.info(f"Written {len(raw_files)} files to {directory}: {stats}")
     context.add_output_metadata(
         metadata={
             "num_new_dicom_files": len(raw_files),
-            "preview_file_paths": MetadataValue.json(json.dumps({"raw_files": raw_files}))
+            **stats,
+            "preview_file_paths": MetadataValue.json(json.dumps({"raw_files": raw_files[:100]}))
         }
     )
     return raw_files
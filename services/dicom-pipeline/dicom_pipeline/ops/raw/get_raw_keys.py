@@ -9,8 +9,9 @@ from dagster import (
 	op
 )
 from dagster_aws.s3 import S3FileManagerResource, S3Resource
-from ...ops.utils import retrieve_s3_keys
+from ...ops.utils import discover_s3_keys
 from ...resources.config import PartitionConfig
+from ...resources.s3_inventory import S3InventoryResource
 
 @op(
 	name="get_raw_keys",
@@ -27,10 +28,11 @@ def s3_get_raw_keys(
 	config: PartitionConfig,
 	s3_raw: S3Resource,
 	s3_io_raw: S3FileManagerResource,
+	s3_raw_inventory: S3InventoryResource,
 	provider_s3_keys: List[String]
 ) -> List[String]:
     context.log.info(f"Successfully processed provider keys: {provider_s3_keys}")
-    target_keys = retrieve_s3_keys(context, config, s3_raw, s3_io_raw)
+    target_keys = list(discover_s3_keys(context, config, s3_raw, s3_io_raw, s3_raw_inventory))
     context.log.info(f"Found provider files: {target_keys}")
     context.add_output_metadata(
         metadata={
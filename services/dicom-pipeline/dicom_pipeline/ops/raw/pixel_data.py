@@ -0,0 +1,282 @@
+"""
+In-process compression of DICOM pixel data, used when `img-compressor` binary
+is not available. Files are decoded with pydicom, rescaled and windowed with
+NumPy and encoded with Pillow across a process pool; images are named and
+partitioned the same way as in `./services/img-compressor/`. Pixel data
+already encoded in a format compatible with the target one is copied from
+encapsulated frames as is, without decoding. Frames are read one at a time,
+so huge multi-frame objects can be written as an image per frame. A pyramid
+of downscaled thumbnails is produced from the same decoded frame.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Iterator, Optional
+import io
+import os
+import numpy as np
+import pydicom
+from PIL import Image
+from pydicom.encaps import generate_frames
+from pydicom.multival import MultiValue
+from pydicom.pixels import iter_pixels
+from pydicom.uid import JPEG2000, JPEG2000Lossless, JPEGBaseline8Bit
+
+IMAGE_FORMATS = {"jpeg": "JPEG", "png": "PNG", "j2k": "JPEG2000"}
+# transfer syntaxes whose frames are valid files of the target format; RLE,
+# uncompressed and any other syntax are decoded and encoded again
+PASSTHROUGH_SYNTAXES = {
+    "jpeg": {JPEGBaseline8Bit},
+    "png": set(),
+    "j2k": {JPEG2000, JPEG2000Lossless},
+}
+
+
+def compressed_image_key(
+    prefix: str,
+    series_instance_uid: str,
+    sop_instance_uid: str,
+    instance_creation_date: str,
+    image_format: str = "jpeg",
+    frame: Optional[int] = None,
+) -> str:
+    """
+    Key of a compressed image of the form
+    `<prefix>/compressed_images/%Y_%m/<SeriesInstanceUID>|<SOPInstanceUID>.jpeg`,
+    frames of streamed multi-frame images get `_<frame>` after SOPInstanceUID.
+    """
+    partition_date = datetime.strptime(instance_creation_date, "%Y%m%d").strftime("%Y_%m")
+    name = f"{series_instance_uid}|{sop_instance_uid}"
+    if frame is not None:
+        name = f"{name}_{frame:05d}"
+    return f"{prefix}/compressed_images/{partition_date}/{name}.{image_format}"
+
+
+def thumbnail_key(key: str, size: int) -> str:
+    """
+    Key of the thumbnail of `size` px for the image at `key`, of the form
+    `<prefix>/compressed_images/%Y_%m/thumbnails/<size>/<name>.jpeg`.
+    """
+    directory, name = key.rsplit("/", 1)
+    return f"{directory}/thumbnails/{size}/{name}"
+
+
+def first_value(value: Any) -> Optional[float]:
+    # window attributes may hold several presets, the first one is the default
+    if value is None or value == "":
+        return None
+    if isinstance(value, MultiValue):
+        value = value[0]
+    return float(value)
+
+
+def window_pixels(
+    pixels: np.ndarray,
+    center: Optional[float],
+    width: Optional[float],
+    invert: bool = False,
+) -> np.ndarray:
+    """
+    Map stored values to 8 bit grayscale with the linear VOI LUT function of
+    PS3.3 C.11.2.1.2, the full range of values is used without a window.
+    """
+    pixels = pixels.astype(np.float64, copy=False)
+    if center is None or width is None or width < 1:
+        low, high = float(pixels.min()), float(pixels.max())
+        scaled = (pixels - low) / max(high - low, 1.0)
+    else:
+        scaled = (pixels - (center - 0.5)) / max(width - 1, 1.0) + 0.5
+    image = np.clip(scaled * 255.0, 0, 255).astype(np.uint8)
+    return 255 - image if invert else image
+
+
+def frame_value(obj: pydicom.Dataset, index: int, sequence: str, keyword: str) -> Any:
+    """
+    Value of `keyword` for frame `index`; enhanced objects keep it in
+    `sequence` of per-frame or shared functional groups, others at top level.
+    """
+    per_frame = obj.get("PerFrameFunctionalGroupsSequence")
+    shared = obj.get("SharedFunctionalGroupsSequence")
+    for group in (per_frame[index] if per_frame and index < len(per_frame) else None, shared[0] if shared else None):
+        items = group.get(sequence) if group is not None else None
+        if items and keyword in items[0]:
+            return items[0][keyword].value
+    return obj.get(keyword)
+
+
+def frame_to_grayscale(obj: pydicom.Dataset, pixels: np.ndarray, index: int = 0) -> np.ndarray:
+    """
+    Frame `index` of `obj` as 8 bit grayscale, with rescale slope and
+    intercept applied before windowing.
+    """
+    if obj.get("SamplesPerPixel", 1) == 3:
+        # colour images are reduced to luma the way `img-compressor` does
+        luma = pixels.astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+        return np.clip(luma, 0, 255).astype(np.uint8)
+    slope = first_value(frame_value(obj, index, "PixelValueTransformationSequence", "RescaleSlope")) or 1.0
+    intercept = first_value(frame_value(obj, index, "PixelValueTransformationSequence", "RescaleIntercept")) or 0.0
+    return window_pixels(
+        pixels * slope + intercept,
+        first_value(frame_value(obj, index, "FrameVOILUTSequence", "WindowCenter")),
+        first_value(frame_value(obj, index, "FrameVOILUTSequence", "WindowWidth")),
+        invert=obj.get("PhotometricInterpretation") == "MONOCHROME1",
+    )
+
+
+def can_pass_through(obj: pydicom.Dataset, image_format: str) -> bool:
+    """
+    Whether encapsulated frames of `obj` can be stored as images of
+    `image_format` without decoding; inverted grayscale and frames of more
+    than 8 bits need decoding and windowing to look the same as transcoded
+    images.
+    """
+    transfer_syntax = obj.file_meta.get("TransferSyntaxUID")
+    return (
+        transfer_syntax in PASSTHROUGH_SYNTAXES[image_format]
+        and obj.get("PhotometricInterpretation") != "MONOCHROME1"
+        and int(obj.get("BitsStored", 8) or 8) <= 8
+    )
+
+
+def encapsulated_frames(filepath: str, offset: int, number_of_frames: int) -> Iterator[bytes]:
+    """
+    Encapsulated frames of the pixel data element at `offset` of `filepath`,
+    read from the file one frame at a time without decoding.
+    """
+    with open(filepath, "rb") as fp:
+        fp.seek(offset)
+        # explicit VR little endian header: tag, VR, reserved bytes and undefined length
+        header = fp.read(12)
+        if header[:4] != b"\xe0\x7f\x10\x00" or header[8:12] != b"\xff\xff\xff\xff":
+            raise ValueError(f"No encapsulated pixel data at offset {offset} of {filepath}")
+        yield from generate_frames(fp, number_of_frames=number_of_frames)
+
+
+def save_thumbnails(
+    image: Image.Image,
+    path: str,
+    key: str,
+    thumbnail_sizes: list[int],
+    image_format: str = "jpeg",
+    quality: int = 95,
+) -> list[tuple[str, str]]:
+    """
+    Save a thumbnail of `image` for every size of `thumbnail_sizes`, limiting
+    the longer side; each level is downscaled from the previous larger one.
+    Images smaller than a level are stored as is to keep keys predictable.
+    """
+    outputs = []
+    level = image
+    for size in sorted(set(thumbnail_sizes), reverse=True):
+        if max(level.size) > size:
+            level = level.copy()
+            level.thumbnail((size, size), Image.Resampling.LANCZOS)
+        level_path = os.path.join(os.path.dirname(path), f"{size}_{os.path.basename(path)}")
+        level.save(level_path, format=IMAGE_FORMATS[image_format], quality=quality)
+        outputs.append((level_path, thumbnail_key(key, size)))
+    return outputs
+
+
+def compress_dicom_file(
+    filepath: str,
+    out_dir: str,
+    prefix: str,
+    image_format: str = "jpeg",
+    quality: int = 95,
+    stream_frames: bool = False,
+    thumbnail_sizes: Optional[list[int]] = None,
+) -> dict:
+    """
+    Encode the first frame of `filepath` to an image in `out_dir`, or every
+    frame as its own image with `stream_frames`; frames compatible with
+    `image_format` are copied without decoding. Pixel data is read from the
+    file one frame at a time, so memory is bounded by a frame rather than the
+    whole volume. Thumbnails of `thumbnail_sizes` are made from the same
+    decoded frame. Returns a result of the same form `img-compressor` reports,
+    along with local paths and keys of images and whether they were transcoded.
+    """
+    try:
+        with open(filepath, "rb") as fp:
+            obj = pydicom.dcmread(fp, stop_before_pixels=True)
+            pixel_data_offset = fp.tell()
+        number_of_frames = int(obj.get("NumberOfFrames", 1) or 1)
+        per_frame = stream_frames and number_of_frames > 1
+        indices = list(range(number_of_frames if per_frame else 1))
+
+        images = []
+        for index in indices:
+            key = compressed_image_key(
+                prefix,
+                str(obj.SeriesInstanceUID),
+                str(obj.SOPInstanceUID),
+                str(obj.InstanceCreationDate),
+                image_format,
+                frame=index if per_frame else None,
+            )
+            images.append((os.path.join(out_dir, key.split("/")[-1]), key))
+
+        outputs = list(images)
+        if can_pass_through(obj, image_format):
+            mode = "passthrough"
+            frames = encapsulated_frames(filepath, pixel_data_offset, number_of_frames)
+            for (path, key), frame in zip(images, frames):
+                with open(path, "wb") as fp:
+                    fp.write(frame)
+                if thumbnail_sizes:
+                    # thumbnails need pixels, frames are decoded only for them
+                    with Image.open(io.BytesIO(frame)) as image:
+                        outputs += save_thumbnails(image, path, key, thumbnail_sizes, image_format, quality)
+            frames.close()
+        else:
+            mode = "transcode"
+            frames = iter_pixels(filepath, indices=indices)
+            for index, (path, key), pixels in zip(indices, images, frames):
+                image = Image.fromarray(frame_to_grayscale(obj, pixels, index))
+                image.save(path, format=IMAGE_FORMATS[image_format], quality=quality)
+                if thumbnail_sizes:
+                    outputs += save_thumbnails(image, path, key, thumbnail_sizes, image_format, quality)
+            frames.close()
+    except Exception as e:
+        return {"file": filepath, "status": "error", "error": f"{type(e).__name__}: {e}"}
+    return {
+        "file": filepath,
+        "status": "ok",
+        "key": images[0][1],
+        "frames": len(images),
+        "thumbnails": len(outputs) - len(images),
+        "mode": mode,
+        "outputs": outputs,
+    }
+
+
+def compress_dicom_files(
+    files: list[str],
+    out_dir: str,
+    prefix: str,
+    max_workers: int,
+    image_format: str = "jpeg",
+    quality: int = 95,
+    stream_frames: bool = False,
+    thumbnail_sizes: Optional[list[int]] = None,
+) -> list[dict]:
+    """
+    Encode `files` across a pool of `max_workers` processes, order of `files`
+    is preserved.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if max_workers <= 1 or len(files) <= 1:
+        return [
+            compress_dicom_file(f, out_dir, prefix, image_format, quality, stream_frames, thumbnail_sizes)
+            for f in files
+        ]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(
+            compress_dicom_file,
+            files,
+            [out_dir] * len(files),
+            [prefix] * len(files),
+            [image_format] * len(files),
+            [quality] * len(files),
+            [stream_frames] * len(files),
+            [thumbnail_sizes] * len(files),
+            chunksize=max(1, len(files) // (max_workers * 4)),
+        ))
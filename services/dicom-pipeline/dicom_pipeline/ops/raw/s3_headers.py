@@ -0,0 +1,156 @@
+"""
+Header-only reads of DICOM objects straight from S3. Objects are fetched in
+ranged GETs of growing size while pydicom parses them, so reading stops at
+`PixelData` after transferring about as much as the header takes instead of
+the whole object. Values of elements pydicom skips are not fetched when they
+are larger than the next range.
+"""
+from functools import lru_cache
+from typing import Optional
+import io
+import pydicom
+from dagster_aws.s3 import S3Resource
+from ...resources.config import S3_LIST_MAX_WORKERS, s3_conf_raw
+from ...resources.s3_client import tuned_s3_client
+
+S3_URI_PREFIX = "s3://"
+
+
+def is_s3_uri(path: str) -> bool:
+    return path.startswith(S3_URI_PREFIX)
+
+
+def split_s3_uri(uri: str) -> tuple[str, str]:
+    """
+    Bucket and key of `s3://<bucket>/<key>`.
+    """
+    bucket, _, key = uri[len(S3_URI_PREFIX):].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"Not an s3 object uri: {uri}")
+    return bucket, key
+
+
+@lru_cache(maxsize=None)
+def s3_client():
+    # one client per process of a pool with credentials of the raw bucket,
+    # endpoint is taken from `AWS_ENDPOINT_URL` when set
+    return tuned_s3_client(S3Resource(**s3_conf_raw._asdict()), S3_LIST_MAX_WORKERS)
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read only, seekable file over an S3 object that fetches bytes on demand.
+    Each fetch doubles the range, from `initial_range` up to `max_range`
+    bytes, and is appended to a contiguous buffer; a seek past the buffer by
+    more than the next range drops it and starts over at the new position.
+    Requests after the first one are pinned to the object's ETag, so a
+    changed object fails instead of mixing versions. `bytes_fetched` counts
+    bytes transferred.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        initial_range: int = 64 * 1024,
+        max_range: int = 8 * 1024 * 1024,
+    ):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.name = f"{S3_URI_PREFIX}{bucket}/{key}"
+        self.size: Optional[int] = None
+        self.etag: Optional[str] = None
+        self.bytes_fetched = 0
+        self.num_requests = 0
+        self._range = initial_range
+        self._max_range = max(initial_range, max_range)
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                self._fetch(0, 1)
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, b) -> int:
+        n = len(b)
+        if n == 0 or (self.size is not None and self._position >= self.size):
+            return 0
+        buffer_end = self._buffer_start + len(self._buffer)
+        if self._position < self._buffer_start or self._position > buffer_end + self._range:
+            # skipped values are not fetched, the buffer starts over at the new position
+            self._buffer = bytearray()
+            self._buffer_start = self._position
+            buffer_end = self._position
+        if self._position + n > buffer_end:
+            self._fetch(buffer_end, max(self._position + n - buffer_end, self._range))
+            self._range = min(self._range * 2, self._max_range)
+        start = self._position - self._buffer_start
+        data = self._buffer[start:start + n]
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def _fetch(self, start: int, length: int) -> None:
+        if self.size is not None:
+            length = min(length, self.size - start)
+            if length <= 0:
+                return
+        kwargs = {"IfMatch": self.etag} if self.etag is not None else {}
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{start + length - 1}", **kwargs
+        )
+        data = response["Body"].read()
+        self.num_requests += 1
+        self.bytes_fetched += len(data)
+        if self.size is None:
+            # `bytes <first>-<last>/<size>`, absent when the whole object is returned
+            content_range = response.get("ContentRange")
+            self.size = int(content_range.rsplit("/", 1)[1]) if content_range else len(data)
+            self.etag = response.get("ETag")
+        if start == self._buffer_start + len(self._buffer):
+            self._buffer += data
+        else:
+            self._buffer = bytearray(data)
+            self._buffer_start = start
+
+
+def read_s3_dicom_header(
+    client,
+    uri: str,
+    specific_tags: Optional[list] = None,
+    initial_range: int = 64 * 1024,
+    max_range: int = 8 * 1024 * 1024,
+) -> tuple[pydicom.Dataset, int]:
+    """
+    Header of the DICOM object at `uri` up to `PixelData`, along with the
+    number of bytes fetched from S3 to parse it.
+    """
+    bucket, key = split_s3_uri(uri)
+    with S3RangeReader(client, bucket, key, initial_range, max_range) as fp:
+        obj = pydicom.dcmread(fp, stop_before_pixels=True, specific_tags=specific_tags)
+        return obj, fp.bytes_fetched
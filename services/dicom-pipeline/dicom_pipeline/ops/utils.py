@@ -1,46 +1,606 @@
-from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+import heapq
+import json
+import math
+import threading
+import time
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 from dagster import List, OpExecutionContext, String
 from dagster_aws.s3 import S3FileManagerResource, S3Resource
-from ..resources.config import PartitionConfig, S3_MAX_LIST_KEYS
+from ..resources.ingestion_ledger import IngestionLedgerResource
+from ..resources.s3_client import tuned_s3_client
+from ..resources.s3_inventory import S3InventoryResource
+from ..resources.config import (
+	PartitionConfig,
+	S3_LIST_MAX_DEPTH,
+	S3_LIST_MAX_WORKERS,
+	S3_MAX_LIST_KEYS
+)
+
+# user metadata of copies holding the ETag of their source, multipart copies get an ETag of their own
+SOURCE_ETAG_METADATA = "source-etag"
+# limits of s3 on parts of a multipart upload and on objects copied with a single request
+MAX_UPLOAD_PARTS = 10000
+MAX_COPY_OBJECT_SIZE = 5 * 1024 ** 3
 
 def is_partition_on_s3(
 	x,
 	config: Optional[PartitionConfig]
 ) -> bool:
-    if PartitionConfig is None:
+    if config is None:
         return True
-    return (x["LastModified"].year == config.year) & \
+    return (x["LastModified"].year == config.year) and \
            (x["LastModified"].month == config.month)
 
+def list_s3_page(
+	s3_client: Any,
+	bucket: str,
+	prefix: str,
+	delimiter: str,
+	token: Optional[str],
+	predicate: Optional[Callable[[dict], bool]] = None
+) -> tuple[list[dict], list[str], Optional[str]]:
+    """
+    A page of objects under `prefix` passing `predicate`, common prefixes
+    below it when `delimiter` is set and the token of the next page.
+    """
+    kwargs = {"ContinuationToken": token} if token is not None else {}
+    response = s3_client.list_objects_v2(
+        Bucket=bucket,
+        Prefix=prefix,
+        Delimiter=delimiter,
+        MaxKeys=S3_MAX_LIST_KEYS,
+        **kwargs
+    )
+    objects = [obj for obj in response.get("Contents", []) if predicate is None or predicate(obj)]
+    prefixes = [p["Prefix"] for p in response.get("CommonPrefixes", [])]
+    return objects, prefixes, response.get("NextContinuationToken") if response.get("IsTruncated") else None
+
+def list_s3_objects(
+	s3_client: Any,
+	bucket: str,
+	prefix: str,
+	predicate: Optional[Callable[[dict], bool]] = None,
+	max_workers: int = S3_LIST_MAX_WORKERS,
+	max_depth: int = S3_LIST_MAX_DEPTH,
+	delimiter: str = "/"
+) -> Iterator[dict]:
+    """
+    Objects under `prefix` passing `predicate`, listed by a pool of
+    `max_workers` threads. Common prefixes are discovered with `delimiter`
+    down to `max_depth` levels below `prefix` and each of them is listed as
+    its own shard, deeper levels are listed flat; pages of a shard follow one
+    another by continuation tokens while shards are listed concurrently.
+    Objects are yielded page by page as they arrive, in no particular order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit(shard_prefix, depth, token=None):
+            page_delimiter = delimiter if depth < max_depth else ""
+            future = pool.submit(
+                list_s3_page, s3_client, bucket, shard_prefix, page_delimiter, token, predicate
+            )
+            pending[future] = (shard_prefix, depth)
+
+        pending = {}
+        submit(prefix, 0)
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard_prefix, depth = pending.pop(future)
+                    objects, prefixes, token = future.result()
+                    if token is not None:
+                        submit(shard_prefix, depth, token)
+                    for child in prefixes:
+                        submit(child, depth + 1)
+                    yield from objects
+        finally:
+            # generator closed early, pages not started yet are dropped
+            for future in pending:
+                future.cancel()
+
 def retrieve_s3_keys(
 	context: OpExecutionContext,
 	config: Optional[PartitionConfig],
 	s3_client: S3Resource,
 	s3_io_manager: S3FileManagerResource
-) -> List[String]:
+) -> Iterator[str]:
     """
 	Common function to list objects for specific `s3_io_manager` and 
-	filter keys by modified date from range in `PartitionConfig`
+	filter keys by modified date from range in `PartitionConfig`;
+	keys are yielded while prefixes of the bucket are listed concurrently
 	"""
-    cursor = ''
-    contents = []
-
-    while True:
-        response = s3_client.list_objects_v2(
-            Bucket=s3_io_manager.s3_bucket,
-            Delimiter="",
-            MaxKeys=S3_MAX_LIST_KEYS,
-            Prefix=s3_io_manager.s3_prefix,
-            StartAfter=cursor,
+    num_keys = 0
+    for obj in list_s3_objects(
+        s3_client.get_client(),
+        s3_io_manager.s3_bucket,
+        s3_io_manager.s3_prefix,
+        predicate=lambda x: is_partition_on_s3(x, config)
+    ):
+        num_keys += 1
+        yield obj["Key"]
+    context.log.info(f"Listed {num_keys} keys in {s3_io_manager.s3_bucket}/{s3_io_manager.s3_prefix}")
+
+def discover_s3_keys(
+	context: Any,
+	config: Optional[PartitionConfig],
+	s3_client: S3Resource,
+	s3_io_manager: S3FileManagerResource,
+	s3_inventory: S3InventoryResource,
+	ingestion_ledger: Optional[IngestionLedgerResource] = None,
+	stage: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Keys of `s3_io_manager` filtered by `config` like `retrieve_s3_keys`; with
+    an inventory of the bucket, keys are read from the latest one in a single
+    scan and only objects modified since it was taken are listed live, the
+    whole bucket prefix is listed otherwise. Keys whose content is done for
+    `stage` in `ingestion_ledger` are dropped.
+    """
+    manifest = s3_inventory.latest_manifest() if s3_inventory.enabled else None
+    inventory_keys = []
+    since = None
+    prefixes = [s3_io_manager.s3_prefix]
+    if manifest is None:
+        context.log.info("No s3 inventory available, listing the bucket")
+    else:
+        inventory_keys = s3_inventory.select_keys(
+            manifest,
+            s3_io_manager.s3_prefix,
+            config.year if config is not None else None,
+            config.month if config is not None else None,
+            ingestion_ledger.duckdb_path if ingestion_ledger is not None else None,
+            stage
         )
-        contents.extend(response.get("Contents", []))
-        if response["KeyCount"] < S3_MAX_LIST_KEYS:
-            break
+        context.log.info(f"Found {len(inventory_keys)} keys in s3 inventory taken at {manifest['created_at']}")
+        yield from inventory_keys
+        # objects written since the inventory, with an overlap as inventories are eventually consistent
+        since = manifest["created_at"] - timedelta(hours=s3_inventory.overlap_hours)
+        prefixes = s3_inventory.live_prefixes or prefixes
+
+    seen = set(inventory_keys)
+    etags = {}
+    for prefix in prefixes:
+        for obj in list_s3_objects(
+            s3_client.get_client(),
+            s3_io_manager.s3_bucket,
+            prefix,
+            predicate=lambda x: (since is None or x["LastModified"] >= since) and is_partition_on_s3(x, config)
+        ):
+            if obj["Key"] not in seen:
+                seen.add(obj["Key"])
+                etags[obj["Key"]] = obj["ETag"]
+    live_keys = list(etags)
+    if ingestion_ledger is not None and stage is not None:
+        live_keys = ingestion_ledger.pending(stage, etags)
+    context.log.info(f"Listed {len(live_keys)} new keys{f' modified since {since}' if since else ''}")
+    yield from live_keys
+
+def balance_by_size(
+	sizes: dict[str, int],
+	num_shards: int
+) -> list[list[str]]:
+    """
+    Split items into at most `num_shards` shards of about equal total size;
+    largest items are placed first, each into the lightest shard so far.
+    """
+    num_shards = max(1, min(num_shards, len(sizes)))
+    shards = [[] for _ in range(num_shards)]
+    heap = [(0, i) for i in range(num_shards)]
+    for key in sorted(sizes, key=sizes.get, reverse=True):
+        total, i = heapq.heappop(heap)
+        shards[i].append(key)
+        heapq.heappush(heap, (total + sizes[key], i))
+    return [shard for shard in shards if shard]
+
+def parse_compressor_results(lines: Iterable[str]) -> dict[str, dict]:
+    """
+    Per file results reported by `img-compressor` as json lines, by file;
+    other output of the binary, e.g. logs, is skipped.
+    """
+    results = {}
+    for line in lines:
+        try:
+            result = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict) and "file" in result and "status" in result:
+            results[result["file"]] = result
+    return results
+
+def write_shard_manifests(
+	s3_client: Any,
+	bucket: str,
+	prefix: str,
+	payload: dict,
+	shards: list[list[str]]
+) -> list[dict]:
+    """
+    Put a manifest with `payload` and the files of every shard to s3, along
+    with the key the lambda function writes results of the shard to.
+    """
+    manifests = []
+    for i, shard in enumerate(shards):
+        manifest = {
+            **payload,
+            'files': shard,
+            'result_bucket': bucket,
+            'result_key': f"{prefix}/results/shard-{i:05d}.jsonl",
+        }
+        manifest_key = f"{prefix}/manifests/shard-{i:05d}.json"
+        s3_client.put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest).encode())
+        manifests.append({**manifest, 'manifest_bucket': bucket, 'manifest_key': manifest_key})
+    return manifests
+
+def fan_out_lambda(
+	context: OpExecutionContext,
+	lambda_client: Any,
+	s3_client: Any,
+	function_name: str,
+	qualifier: Optional[str],
+	manifests: list[dict],
+	max_concurrency: int,
+	poll_interval_s: float,
+	timeout_s: float
+) -> dict[str, dict]:
+    """
+    Invoke `function_name` asynchronously for every shard manifest, keeping
+    at most `max_concurrency` shards in flight, and gather per file results
+    from result manifests as shards finish. Files of shards that failed to
+    start or did not report in `timeout_s` are marked as errors.
+    """
+    def failed(manifest, error):
+        return {f: {"file": f, "status": "error", "error": error} for f in manifest['files']}
+
+    pending = list(manifests)
+    in_flight = {}
+    results = {}
+    while pending or in_flight:
+        while pending and len(in_flight) < max_concurrency:
+            manifest = pending.pop(0)
+            request = {
+                'FunctionName': function_name,
+                'InvocationType': "Event",
+                'Payload': json.dumps({
+                    'manifest_bucket': manifest['manifest_bucket'],
+                    'manifest_key': manifest['manifest_key'],
+                }),
+            }
+            if qualifier:
+                request['Qualifier'] = qualifier
+            try:
+                lambda_client.invoke(**request)
+            except Exception as e:
+                context.log.error(f"Failed to invoke {function_name} for {manifest['manifest_key']}: {e}")
+                results.update(failed(manifest, f"invoke failed: {e}"))
+                continue
+            in_flight[manifest['result_key']] = (manifest, time.monotonic())
+
+        for result_key, (manifest, started) in list(in_flight.items()):
+            try:
+                body = s3_client.get_object(Bucket=manifest['result_bucket'], Key=result_key)["Body"].read()
+            except s3_client.exceptions.NoSuchKey:
+                if time.monotonic() - started > timeout_s:
+                    context.log.error(f"No result for {manifest['manifest_key']} after {timeout_s}s")
+                    results.update(failed(manifest, "timed out"))
+                    del in_flight[result_key]
+                continue
+            shard_results = parse_compressor_results(body.decode().splitlines())
+            missing = failed(manifest, "no result reported by lambda")
+            results.update({f: shard_results.get(f, missing[f]) for f in manifest['files']})
+            del in_flight[result_key]
+            context.log.info(f"Shard {manifest['manifest_key']} finished, {len(pending)} shards pending")
+
+        if in_flight:
+            time.sleep(poll_interval_s)
+    return results
+
+class PartialDownload:
+    """
+    Object downloaded in chunks to a hidden `.<name>.part` file next to `path`,
+    done chunks are recorded in `.<name>.part.json` so an interrupted download
+    resumes with missing chunks only. Completed files get their ETag stored
+    in `.<name>.etag` to be skipped by later downloads.
+    """
+    def __init__(self, key: str, path: Path, size: int, etag: str, chunksize: int):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.chunksize = max(1, chunksize)
+        self.num_chunks = max(1, math.ceil(size / self.chunksize))
+        self.part = path.with_name(f".{path.name}.part")
+        self.progress = path.with_name(f".{path.name}.part.json")
+        self.lock = threading.Lock()
+
+        self.done = set()
+        if self.part.exists() and self.progress.exists():
+            state = json.loads(self.progress.read_text())
+            if (state["etag"], state["size"], state["chunksize"]) == (etag, size, self.chunksize):
+                self.done = set(state["done"])
+        if not self.done:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.part, "wb") as fp:
+                fp.truncate(size)
+        self.resumed = len(self.done) > 0
+
+    @staticmethod
+    def etag_path(path: Path) -> Path:
+        return path.with_name(f".{path.name}.etag")
+
+    @classmethod
+    def is_complete(cls, path: Path, size: int, etag: str) -> bool:
+        """
+        Whether `path` already holds the object, by its ETag when recorded and
+        by size otherwise.
+        """
+        if not path.exists() or path.stat().st_size != size:
+            return False
+        etag_path = cls.etag_path(path)
+        return not etag_path.exists() or etag_path.read_text() == etag
+
+    def pending(self) -> list[tuple[int, int, int]]:
+        # (chunk, first byte, last byte) of chunks left to download
+        return [
+            (i, i * self.chunksize, min(self.size, (i + 1) * self.chunksize) - 1)
+            for i in range(self.num_chunks) if i not in self.done
+        ]
+
+    def write(self, chunk: int, data: bytes) -> bool:
+        """
+        Write `data` of `chunk` and record it as done; returns True once the
+        last chunk is written and the file is moved to `path`.
+        """
+        with self.lock:
+            with open(self.part, "r+b") as fp:
+                fp.seek(chunk * self.chunksize)
+                fp.write(data)
+            self.done.add(chunk)
+            if len(self.done) < self.num_chunks:
+                self.progress.write_text(json.dumps({
+                    "etag": self.etag, "size": self.size, "chunksize": self.chunksize, "done": sorted(self.done)
+                }))
+                return False
+            self.part.replace(self.path)
+            self.etag_path(self.path).write_text(self.etag)
+            self.progress.unlink(missing_ok=True)
+            return True
+
+def download_s3_objects(
+	context: OpExecutionContext,
+	s3_client: Any,
+	bucket: str,
+	keys: list[str],
+	directory: Path,
+	transfer_config: TransferConfig
+) -> tuple[list[str], dict[str, Any]]:
+    """
+    Download `keys` under `directory` with ranged GETs of
+    `transfer_config.multipart_chunksize` for objects above
+    `multipart_threshold`, running at most `max_concurrency` requests at
+    once across all objects. Files with a matching ETag, or size when no ETag
+    was recorded, are skipped and interrupted downloads are resumed; returns
+    local files in order of `keys` with transfer statistics. Keys that fail
+    their HEAD request are counted as failed without stopping the others.
+    """
+    start = time.monotonic()
+    stats = {"num_downloaded": 0, "num_skipped": 0, "num_resumed": 0, "num_failed": 0, "bytes_downloaded": 0}
+
+    def head(key):
+        try:
+            response = s3_client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            context.log.error(f"Failed to head s3://{bucket}/{key}: {e}")
+            return None
+        return response["ContentLength"], response["ETag"]
+
+    def fetch(download, chunk, first, last):
+        request = {'Bucket': bucket, 'Key': download.key, 'IfMatch': download.etag}
+        if download.size > 0:
+            request['Range'] = f"bytes={first}-{last}"
+        data = s3_client.get_object(**request)["Body"].read()
+        return download, download.write(chunk, data), len(data)
+
+    with ThreadPoolExecutor(max_workers=transfer_config.max_concurrency) as pool:
+        downloads = []
+        failed = set()
+        for key, response in zip(keys, pool.map(head, keys)):
+            if response is None:
+                failed.add(key)
+                continue
+            size, etag = response
+            path = directory.joinpath(key)
+            if PartialDownload.is_complete(path, size, etag):
+                stats["num_skipped"] += 1
+                continue
+            chunksize = transfer_config.multipart_chunksize if size >= transfer_config.multipart_threshold else size
+            download = PartialDownload(key, path, size, etag, chunksize)
+            stats["num_resumed"] += download.resumed
+            downloads.append(download)
+
+        # chunks of all objects share the pool, so small files do not wait for large ones
+        futures = [
+            pool.submit(fetch, download, *chunk)
+            for download in downloads for chunk in download.pending()
+        ]
+        for future in futures:
+            try:
+                download, completed, num_bytes = future.result()
+            except Exception as e:
+                # done chunks stay recorded, next run resumes with the rest
+                context.log.error(f"Failed to download a chunk from s3://{bucket}: {e}")
+                continue
+            stats["bytes_downloaded"] += num_bytes
+            stats["num_downloaded"] += completed
+        failed |= {download.key for download in downloads if not download.path.exists()}
+
+    elapsed = max(time.monotonic() - start, 1e-9)
+    stats["num_failed"] = len(failed)
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["mb_per_s"] = round(stats["bytes_downloaded"] / elapsed / 1e6, 3)
+    stats["files_per_s"] = round(stats["num_downloaded"] / elapsed, 3)
+    files = [str(directory.joinpath(key)) for key in keys if key not in failed]
+    return files, stats
+
+def head_s3_object(s3_client: Any, bucket: str, key: str) -> Optional[dict]:
+    # `head_object` response, None when the object does not exist
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def head_s3_objects(
+	s3_client: Any,
+	bucket: str,
+	keys: list[str],
+	max_concurrency: int
+) -> dict[str, Optional[dict]]:
+    """
+    `head_object` responses of `keys` requested concurrently, by key; None
+    for objects that do not exist.
+    """
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        return dict(zip(keys, pool.map(lambda key: head_s3_object(s3_client, bucket, key), keys)))
+
+def copy_s3_objects(
+	context: OpExecutionContext,
+	s3_client: Any,
+	source_bucket: str,
+	sources: dict[str, dict],
+	target_bucket: str,
+	transfer_config: TransferConfig
+) -> tuple[dict[str, dict], dict[str, Any]]:
+    """
+    Server side copy of objects described by `sources`, `head_object`
+    responses by key, to the same keys of `target_bucket`. Objects above
+    `transfer_config.multipart_threshold` are copied with multipart
+    `UploadPartCopy` in parts of `multipart_chunksize`, the rest with
+    `CopyObject`; at most `max_concurrency` requests run at once across all
+    objects. Copies record the ETag of their source in metadata; objects
+    already in the target with the same size and either the same ETag or a
+    recorded source ETag matching it are skipped. Returns the
+    result of every key along with transfer statistics.
+    """
+    start = time.monotonic()
+    results = {}
+    with ThreadPoolExecutor(max_workers=transfer_config.max_concurrency) as pool:
+        targets = dict(zip(sources, pool.map(lambda key: head_s3_object(s3_client, target_bucket, key), sources)))
+        singles, multiparts = [], []
+        for key, source in sources.items():
+            size, etag = source["ContentLength"], source["ETag"]
+            target = targets[key]
+            if target is not None and target["ContentLength"] == size and etag in (
+                target["ETag"], target.get("Metadata", {}).get(SOURCE_ETAG_METADATA)
+            ):
+                results[key] = {"status": "skipped", "bytes": size}
+            elif size >= min(transfer_config.multipart_threshold, MAX_COPY_OBJECT_SIZE):
+                multiparts.append(key)
+            else:
+                singles.append(key)
+
+        def target_metadata(key):
+            return {
+                "ContentType": sources[key].get("ContentType", "binary/octet-stream"),
+                "Metadata": {**sources[key].get("Metadata", {}), SOURCE_ETAG_METADATA: sources[key]["ETag"]},
+            }
+
+        def copy_object(key):
+            s3_client.copy_object(
+                Bucket=target_bucket,
+                Key=key,
+                CopySource={"Bucket": source_bucket, "Key": key},
+                CopySourceIfMatch=sources[key]["ETag"],
+                MetadataDirective="REPLACE",
+                **target_metadata(key)
+            )
+            return key
+
+        def copy_part(key, upload_id, part, first, last):
+            response = s3_client.upload_part_copy(
+                Bucket=target_bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part,
+                CopySource={"Bucket": source_bucket, "Key": key},
+                CopySourceIfMatch=sources[key]["ETag"],
+                CopySourceRange=f"bytes={first}-{last}",
+            )
+            return key, part, response["CopyPartResult"]["ETag"]
 
-        cursor = response["Contents"][-1]["Key"]
+        futures = {pool.submit(copy_object, key): key for key in singles}
+        uploads = {}
+        for key in multiparts:
+            size = sources[key]["ContentLength"]
+            # parts are at least `multipart_chunksize` and there are no more than 10000 of them
+            chunksize = max(transfer_config.multipart_chunksize, math.ceil(size / MAX_UPLOAD_PARTS))
+            try:
+                upload_id = s3_client.create_multipart_upload(
+                    Bucket=target_bucket, Key=key, **target_metadata(key)
+                )["UploadId"]
+            except Exception as e:
+                results[key] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                continue
+            num_parts = math.ceil(size / chunksize)
+            uploads[key] = {"upload_id": upload_id, "parts": {}, "num_parts": num_parts}
+            for i in range(num_parts):
+                future = pool.submit(copy_part, key, upload_id, i + 1, i * chunksize, min(size, (i + 1) * chunksize) - 1)
+                futures[future] = key
 
-    key_mask = [x["LastModified"] for x in contents if is_partition_on_s3(x, config)]
-    target_keys = [obj["Key"] for obj in contents[key_mask]]
+        # parts of all objects share the pool, so small objects do not wait for large ones
+        for future in as_completed(futures):
+            key = futures[future]
+            if key in results:
+                continue
+            try:
+                outcome = future.result()
+            except Exception as e:
+                results[key] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                if key in uploads:
+                    s3_client.abort_multipart_upload(Bucket=target_bucket, Key=key, UploadId=uploads[key]["upload_id"])
+                continue
+            if key not in uploads:
+                results[key] = {"status": "copied", "mode": "single", "bytes": sources[key]["ContentLength"]}
+                continue
+            upload = uploads[key]
+            upload["parts"][outcome[1]] = outcome[2]
+            if len(upload["parts"]) < upload["num_parts"]:
+                continue
+            try:
+                s3_client.complete_multipart_upload(
+                    Bucket=target_bucket,
+                    Key=key,
+                    UploadId=upload["upload_id"],
+                    MultipartUpload={"Parts": [
+                        {"PartNumber": part, "ETag": upload["parts"][part]} for part in sorted(upload["parts"])
+                    ]},
+                )
+                results[key] = {
+                    "status": "copied", "mode": "multipart", "parts": upload["num_parts"],
+                    "bytes": sources[key]["ContentLength"]
+                }
+            except Exception as e:
+                results[key] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                s3_client.abort_multipart_upload(Bucket=target_bucket, Key=key, UploadId=upload["upload_id"])
 
-    context.log.info(f"Found provider files: {target_keys}")
-    return target_keys
+    for key, result in results.items():
+        if result["status"] == "failed":
+            context.log.error(f"Failed to copy s3://{source_bucket}/{key}: {result['error']}")
+    elapsed = max(time.monotonic() - start, 1e-9)
+    copied = [r for r in results.values() if r["status"] == "copied"]
+    stats = {
+        "num_copied": len(copied),
+        "num_multipart": sum(r.get("mode") == "multipart" for r in copied),
+        "num_skipped": sum(r["status"] == "skipped" for r in results.values()),
+        "num_failed": sum(r["status"] == "failed" for r in results.values()),
+        "bytes_copied": sum(r["bytes"] for r in copied),
+    }
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["mb_per_s"] = round(stats["bytes_copied"] / elapsed / 1e6, 3)
+    stats["files_per_s"] = round(stats["num_copied"] / elapsed, 3)
+    return {key: results[key] for key in sources}, stats
@@ -11,6 +11,8 @@ from dagster_snowflake_pandas import SnowflakePandasTypeHandler
 from dagster_snowflake_pyspark import SnowflakePySparkTypeHandler
 from dagster._utils import file_relative_path
 from .config import (
+	AWS_PROVIDER_INVENTORY,
+	AWS_RAW_INVENTORY,
 	CONCURRENCY_LEVEL,
 	DBT_PROJECT_DIR,
 	DBT_DATABASE_PATH,
@@ -25,10 +27,14 @@ from .config import (
 	spark_conf
 )
 from .dbt import DbtCli2 as DbtCli
+from .dicom_file_index import DicomFileIndexResource
+from .dicom_header_cache import DicomHeaderCacheResource
 from .directory_resource import TemporaryDirectoryResource
 from .duckdb_parquet_io_manager import DuckDBPartitionedParquetIOManager
 from .healthchecks import HealthchecksIO
+from .ingestion_ledger import IngestionLedgerResource
 from .lambda_resource import LambdaResource
+from .s3_inventory import S3InventoryResource
 from .snowflake_io_manager import SnowflakeIOManager
 from .parquet_io_manager import S3PartitionedParquetIOManager, LocalPartitionedParquetIOManager
 from .multi_db_and_parquet_io_manager import MultiDuckDBAndLocalPartitionedParquetIOManager
@@ -42,6 +48,10 @@ s3_raw = S3Resource(**s3_conf_raw_dict)
 s3_io_raw = S3FileManagerResource(**s3_conf_raw_dict)
 pyspark_conf_raw = spark_conf
 
+# inventories to discover keys of large buckets without listing them
+s3_provider_inventory = S3InventoryResource(location=AWS_PROVIDER_INVENTORY, s3=s3_provider)
+s3_raw_inventory = S3InventoryResource(location=AWS_RAW_INVENTORY, s3=s3_raw)
+
 
 # stage layer bucket to put normalized files to
 s3_stage = S3Resource(**s3_conf_stage_dict)
@@ -54,7 +64,10 @@ s3_io_prod = S3FileManagerResource(**s3_conf_prod_dict)
 pyspark_configured = PySparkResource(spark_config=spark_conf)
 
 default_resources = {
+	"dicom_file_index": DicomFileIndexResource(),
+	"dicom_header_cache": DicomHeaderCacheResource(),
 	"healthchecks": HealthchecksIO.configure_at_launch(),
+	"ingestion_ledger": IngestionLedgerResource(),
 	"lambda_client": LambdaResource(),
 	"pyspark": pyspark_configured,
 	"s3_raw": s3_raw,
@@ -62,6 +75,9 @@ default_resources = {
 	"s3_io_stage": s3_io_stage,
 	"s3_provider": s3_provider,
 	"s3_provider_io": s3_provider_io,
+	"s3_provider_inventory": s3_provider_inventory,
+	"s3_raw_inventory": s3_raw_inventory,
+	"s3_stage": s3_stage,
 	"slack": SlackResource(token=SLACK_TOKEN),
 	"temp_dir": TemporaryDirectoryResource.configure_at_launch(),
 }
@@ -8,6 +8,8 @@ from .dbt import (
 	DBT_PROFILES_DIR
 )
 from .aws import (
+	AWS_PROVIDER_INVENTORY,
+	AWS_RAW_INVENTORY,
 	LAMBDA_FUNCTION_NAME,
 	LAMBDA_QUALIFIER,
 	s3_conf_provider,
@@ -19,6 +21,8 @@ from .aws import (
 	s3_conf_provider_dict,
 	s3_conf_raw_dict,
 	s3_conf_stage_dict,
+	S3_LIST_MAX_DEPTH,
+	S3_LIST_MAX_WORKERS,
     S3_MAX_LIST_KEYS
 )
 from .slack import (
@@ -29,12 +33,25 @@ from .slack import (
 from .lib import (
 	COLUMN_PARTITION_MAP,
 	CONCURRENCY_LEVEL,
+	CompressConfig,
+	CopyConfig,
 	DICOM_FILE_DIRECTORY,
+	DICOM_FILE_INDEX_PATH,
+	DICOM_HEADER_CACHE_PATH,
+	DICOM_INGESTION_LEDGER_PATH,
 	DAGSTER_ENV,
+	DownloadConfig,
+	IMAGE_STORE_PATH,
+	ImageStoreConfig,
 	PARTITION_OUT_DATE_FORMAT,
 	PYARROW_EXISTING_DATA_BEHAVIOR,
 	PROJECT_NAME,
 	PARTITION_RESTATEMENT,
+	RAW_DOWNLOAD_PATH,
 	PARTITION_MONTHLY,
-	PartitionConfig
+	PartitionConfig,
+	S3_INVENTORY_CACHE_PATH,
+	THUMBNAIL_SIZES,
+	VOLUME_STORE_PATH,
+	VolumeConfig
 )
@@ -58,8 +58,16 @@ s3_conf_prod_dict['s3_bucket'] = AWS_PROD_BUCKET
 s3_conf_prod_dict['s3_prefix'] = AWS_PROD_PREFIX
 s3_conf_prod = S3Config(**s3_conf_prod_dict)
 
+# s3 inventory configurations of provider and raw buckets used to discover keys without listing,
+# `s3://<bucket>/<prefix>/<source bucket>/<config id>`; empty to list buckets
+AWS_PROVIDER_INVENTORY = os.getenv("AWS_PROVIDER_INVENTORY", "")
+AWS_RAW_INVENTORY = os.getenv("AWS_RAW_INVENTORY", "")
+
 # service to compress images from services/img-compressor
 LAMBDA_FUNCTION_NAME = os.getenv("AWS_LAMBDA_FUNCTION_NAME", "")
 LAMBDA_QUALIFIER = os.getenv("AWS_LAMBDA_QUALIFIER", "") 
 # limit for listing keys to avoid deadlocks on sparse dirs
 S3_MAX_LIST_KEYS = 1000
+# threads listing prefixes of a bucket at once, prefixes deeper than the depth are listed flat
+S3_LIST_MAX_WORKERS = 16
+S3_LIST_MAX_DEPTH = 2
@@ -18,11 +18,69 @@ PARTITION_OUT_DATE_FORMAT = "%Y_%m"
 PARTITION_MONTHLY = MonthlyPartitionsDefinition(start_date="2004-08", end_date="2004-09", fmt='%Y-%m')
 PARTITION_RESTATEMENT = MonthlyPartitionsDefinition(start_date="2000-01", end_date="2023-09", fmt='%Y-%m')
 CONCURRENCY_LEVEL = 3
+# longer side in px of thumbnails stored next to compressed images
+THUMBNAIL_SIZES = [64, 256, 1024]
+# raw files downloaded from s3, kept across runs so interrupted downloads resume
+RAW_DOWNLOAD_PATH = os.getenv("RAW_DOWNLOAD_PATH", "raw_downloads")
 
 class PartitionConfig(Config):
     column: str
     year: int
     month: int
 
+class CompressConfig(Config):
+    # `img-compressor` or python processes running at once, files are balanced by size
+    max_workers: int = os.cpu_count() or 1
+    binary: str = "img-compressor"
+    # rust | python | auto, the latter picks rust when `binary` is on PATH
+    backend: str = "auto"
+    # encoding of the python backend, jpeg | png | j2k; compatible pixel data is not re-encoded
+    image_format: str = "jpeg"
+    quality: int = 95
+    # write every frame of multi-frame objects as its own image, decoding one frame at a time
+    stream_frames: bool = False
+    # pyramid of thumbnails made from the same decoded frame by the python backend, empty to disable
+    thumbnail_sizes: list[int] = THUMBNAIL_SIZES
+
+class CopyConfig(Config):
+    # server side copy requests in flight at once across all objects
+    max_concurrency: int = 32
+    # objects above the threshold are copied with multipart `UploadPartCopy` in parts of chunk size
+    multipart_threshold_mb: int = 128
+    multipart_chunksize_mb: int = 64
+
+class DownloadConfig(Config):
+    # requests in flight at once across all objects
+    max_concurrency: int = 16
+    # objects above the threshold are fetched in ranged GETs of chunk size
+    multipart_threshold_mb: int = 16
+    multipart_chunksize_mb: int = 8
+    # persistent directory holding downloads with their resume state
+    directory: str = RAW_DOWNLOAD_PATH
+
+class ImageStoreConfig(Config):
+    # images are letterboxed to `image_size` x `image_size`, thumbnails are read when available
+    image_size: int = 256
+    # images per `.npy` shard of a series
+    shard_size: int = 1024
+    # concurrent downloads of compressed images
+    max_workers: int = 16
+
+class VolumeConfig(Config):
+    # series with fewer slices of the same shape are not assembled into volumes
+    min_slices: int = 2
+
 DICOM_FILE_DIRECTORY = "../../data/dicom-files/"
+# persisted mapping of local dicom files to their partition dates
+DICOM_FILE_INDEX_PATH = os.getenv("DICOM_FILE_INDEX_PATH", "dicom_file_index.duckdb")
+# persisted header rows of local dicom files reused across runs
+DICOM_HEADER_CACHE_PATH = os.getenv("DICOM_HEADER_CACHE_PATH", "dicom_header_cache.duckdb")
+# ledger of dicom files already handled by every stage of ingestion
+DICOM_INGESTION_LEDGER_PATH = os.getenv("DICOM_INGESTION_LEDGER_PATH", "dicom_ingestion_ledger.duckdb")
+# data files of s3 inventories downloaded for key discovery
+S3_INVENTORY_CACHE_PATH = os.getenv("S3_INVENTORY_CACHE_PATH", "s3_inventory_cache")
+# memory mappable shards of decoded images with parquet index per partition
+IMAGE_STORE_PATH = os.getenv("IMAGE_STORE_PATH", "image_store")
+# memory mappable 3D volumes of series with json sidecars per partition
+VOLUME_STORE_PATH = os.getenv("VOLUME_STORE_PATH", "volume_store")
 PYARROW_EXISTING_DATA_BEHAVIOR = 'overwrite_or_ignore' #| overwrite_or_ignore | error | delete_matching
@@ -0,0 +1,112 @@
+from datetime import datetime
+from typing import Optional
+import duckdb
+import inflection as inf
+import pandas as pd
+import pydicom
+from pydantic import Field
+from dagster import ConfigurableResource
+from .config import (
+	COLUMN_PARTITION_MAP,
+	DICOM_FILE_INDEX_PATH
+)
+from .file_fingerprint import file_stats
+
+# dates used to partition raw entities, i.e. `study_date`, `instance_creation_date`
+PARTITION_COLUMNS = sorted(set(COLUMN_PARTITION_MAP.values()))
+
+
+class DicomFileIndexResource(ConfigurableResource):
+    """
+    Persisted index of local DICOM files keyed by path, size and modification
+    time that maps every file to the dates used to partition raw entities.
+    A file is parsed only when it is new or changed since it was indexed, so
+    monthly partitions can pick relevant files without opening the rest.
+    """
+    duckdb_path: str = Field(
+        default=DICOM_FILE_INDEX_PATH,
+        description="Path to DuckDB database holding the file index.",
+    )
+
+    def update(self, files: list[str]) -> int:
+        """
+        Index files that are missing or changed since the last update; returns
+        the number of files that had to be parsed.
+        """
+        stats_df = file_stats(files)
+
+        with self._connect() as con:
+            stale = con.execute(
+                "select s.path, s.size, s.mtime from stats_df s "
+                "left join file_index i on s.path = i.path and s.size = i.size and s.mtime = i.mtime "
+                "where i.path is null"
+            ).fetchdf()
+            if len(stale) == 0:
+                return 0
+            dates = [self._read_dates(path) for path in stale.path]
+            for i, column in enumerate(PARTITION_COLUMNS):
+                stale[column] = [d[i] for d in dates]
+            con.execute(
+                f"insert or replace into file_index select path, size, mtime, {', '.join(PARTITION_COLUMNS)} from stale"
+            )
+        return len(stale)
+
+    def select(
+        self,
+        files: list[str],
+        partition_columns: list[str],
+        start: datetime,
+        end: datetime,
+    ) -> list[str]:
+        """
+        Pick files with any of `partition_columns` in [start, end) range,
+        order of `files` is preserved.
+        """
+        files_df = pd.DataFrame({'path': files})
+        condition = " or ".join(f"(i.{c} >= ? and i.{c} < ?)" for c in partition_columns)
+        with self._connect() as con:
+            selected = con.execute(
+                f"select i.path from file_index i join files_df f on i.path = f.path where {condition}",
+                [value for _ in partition_columns for value in (start, end)],
+            ).fetchdf()
+        selected = set(selected.path)
+        return [f for f in files if f in selected]
+
+    def partition_keys(
+        self,
+        files: list[str],
+        partition_columns: list[str],
+        fmt: str = "%Y-%m",
+    ) -> list[str]:
+        """
+        Distinct monthly partition keys covered by `files`.
+        """
+        files_df = pd.DataFrame({'path': files})
+        dates = " union ".join(
+            f"select i.{c} as d from file_index i join files_df f on i.path = f.path" for c in partition_columns
+        )
+        with self._connect() as con:
+            keys = con.execute(
+                f"select distinct date_trunc('month', d) as d from ({dates}) where d is not null order by d"
+            ).fetchdf()
+        return [d.strftime(fmt) for d in pd.to_datetime(keys.d)]
+
+    def _read_dates(self, filepath: str) -> list[Optional[datetime]]:
+        keywords = [inf.camelize(c) for c in PARTITION_COLUMNS]
+        try:
+            with pydicom.dcmread(filepath, stop_before_pixels=True, specific_tags=keywords) as obj:
+                values = [obj.get(k) for k in keywords]
+        except Exception:
+            # keep unreadable files indexed without dates to not parse them again
+            return [None for _ in keywords]
+        dates = pd.to_datetime(pd.Series([str(v) if v else None for v in values]), format="%Y%m%d", errors="coerce")
+        return [None if pd.isnull(d) else d.date() for d in dates]
+
+    def _connect(self):
+        con = duckdb.connect(database=self.duckdb_path, read_only=False)
+        con.execute(
+            "create table if not exists file_index ("
+            "path varchar primary key, size bigint, mtime double, "
+            f"{', '.join(f'{c} date' for c in PARTITION_COLUMNS)})"
+        )
+        return con
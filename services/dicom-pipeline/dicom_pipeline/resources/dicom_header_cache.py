@@ -0,0 +1,101 @@
+from typing import Any
+import pickle
+import time
+import duckdb
+from pydantic import Field
+from dagster import ConfigurableResource
+from .config import DICOM_HEADER_CACHE_PATH
+from .file_fingerprint import file_sha256, file_stats
+
+
+class DicomHeaderCacheResource(ConfigurableResource):
+    """
+    Persisted cache of header rows extracted from local DICOM files, keyed by
+    path, size and modification time of a file and by a key of the columns
+    the row was extracted for. Reruns and backfills over unchanged files read
+    rows from the cache instead of parsing files again. Least recently used
+    rows are evicted once the cache outgrows `max_size_mb`.
+    """
+    duckdb_path: str = Field(
+        default=DICOM_HEADER_CACHE_PATH,
+        description="Path to DuckDB database holding cached header rows.",
+    )
+    max_size_mb: int = Field(
+        default=1024,
+        description="Size of cached rows above which least recently used rows are evicted.",
+    )
+    verify_hash: bool = Field(
+        default=False,
+        description="Compare content hash of a file with the cached one before a hit is used.",
+    )
+    enabled: bool = Field(
+        default=True,
+        description="Disable to always parse files.",
+    )
+
+    def get(self, files: list[str], key: str) -> dict[str, Any]:
+        """
+        Cached rows of unchanged `files` extracted for `key`, by file path.
+        """
+        if not self.enabled:
+            return {}
+        stats_df = file_stats(files)
+        if len(stats_df) == 0:
+            return {}
+        with self._connect() as con:
+            hits = con.execute(
+                "select c.path, c.sha256, c.row from header_cache c "
+                "join stats_df s on c.path = s.path and c.size = s.size and c.mtime = s.mtime "
+                "where c.key = ?",
+                [key],
+            ).fetchdf()
+            if self.verify_hash:
+                hits = hits[hits.path.map(file_sha256) == hits.sha256]
+            if len(hits) > 0:
+                hits_df = hits[['path']]
+                con.execute(
+                    "update header_cache set last_access = ? "
+                    "where key = ? and path in (select path from hits_df)",
+                    [time.time(), key],
+                )
+        return {path: pickle.loads(row) for path, row in zip(hits.path, hits.row)}
+
+    def put(self, rows: dict[str, Any], key: str) -> None:
+        """
+        Cache extracted `rows` by file path for `key` and evict least recently
+        used rows above the size limit.
+        """
+        if not self.enabled:
+            return
+        stats_df = file_stats(list(rows))
+        if len(stats_df) == 0:
+            return
+        stats_df['key'] = key
+        stats_df['sha256'] = [file_sha256(path) if self.verify_hash else None for path in stats_df.path]
+        stats_df['row'] = [pickle.dumps(rows[path]) for path in stats_df.path]
+        stats_df['last_access'] = time.time()
+        with self._connect() as con:
+            con.execute(
+                "insert or replace into header_cache "
+                "select path, key, size, mtime, sha256, row, last_access from stats_df"
+            )
+            self._evict(con)
+
+    def _evict(self, con) -> None:
+        # drop rows past the running size total of most recently used ones
+        con.execute(
+            "delete from header_cache where (path, key) in ("
+            "select path, key from ("
+            "select path, key, sum(octet_length(row)) over (order by last_access desc, path, key) as total "
+            "from header_cache) where total > ?)",
+            [self.max_size_mb * 1024 * 1024],
+        )
+
+    def _connect(self):
+        con = duckdb.connect(database=self.duckdb_path, read_only=False)
+        con.execute(
+            "create table if not exists header_cache ("
+            "path varchar, key varchar, size bigint, mtime double, sha256 varchar, "
+            "row blob, last_access double, primary key (path, key))"
+        )
+        return con
@@ -0,0 +1,29 @@
+"""
+Fingerprints of local files shared by resources that persist state about
+them: path, size and modification time tell whether a file changed since it
+was seen, sha256 of the content identifies it across paths.
+"""
+import hashlib
+import os
+import pandas as pd
+
+
+def file_stats(files: list[str]) -> pd.DataFrame:
+    """
+    Path, size and modification time of existing local `files`, others
+    (e.g. objects on s3) are left out.
+    """
+    stats = []
+    for filepath in files:
+        if os.path.isfile(filepath):
+            fstats = os.stat(filepath)
+            stats.append((filepath, fstats.st_size, fstats.st_mtime))
+    return pd.DataFrame(stats, columns=['path', 'size', 'mtime'])
+
+
+def file_sha256(filepath: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -0,0 +1,133 @@
+from typing import Optional, Union
+import time
+import duckdb
+import pandas as pd
+from pydantic import Field
+from dagster import ConfigurableResource
+from .config import DICOM_INGESTION_LEDGER_PATH
+from .file_fingerprint import file_sha256, file_stats
+
+# statuses of an instance within a stage of ingestion
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def ingestion_stage(name: str, start: Optional[str] = None, end: Optional[str] = None) -> str:
+    """
+    Stage of the ledger for an op or asset, partitioned runs track each
+    partition key, or range of keys, separately.
+    """
+    if start is None:
+        return name
+    if end is None or end == start:
+        return f"{name}:{start}"
+    return f"{name}:{start}...{end}"
+
+
+class IngestionLedgerResource(ConfigurableResource):
+    """
+    Durable ledger of ingested DICOM files keyed by content hash and stage,
+    recording the SOPInstanceUID of the instance once it is parsed. Sensors
+    and ops consult the ledger to hand only new or changed content to the
+    next stage, so reruns do not reprocess the whole history. Content hash is
+    sha256 for local files (memoized by path, size and mtime) and ETag for
+    objects on s3.
+    """
+    duckdb_path: str = Field(
+        default=DICOM_INGESTION_LEDGER_PATH,
+        description="Path to DuckDB database holding the ingestion ledger.",
+    )
+
+    def file_hashes(self, files: list[str]) -> dict[str, str]:
+        """
+        Content hashes of local `files` by path; a file is hashed again only
+        when its size or modification time changed.
+        """
+        stats_df = file_stats(files)
+        with self._connect() as con:
+            known = con.execute(
+                "select s.path, h.content_hash from stats_df s "
+                "join file_hash h on s.path = h.path and s.size = h.size and s.mtime = h.mtime"
+            ).fetchdf()
+            stale = stats_df[~stats_df.path.isin(known.path)].copy()
+            if len(stale) > 0:
+                stale['content_hash'] = [file_sha256(path) for path in stale.path]
+                con.execute("insert or replace into file_hash select path, size, mtime, content_hash from stale")
+        hashes = dict(zip(known.path, known.content_hash))
+        if len(stale) > 0:
+            hashes.update(zip(stale.path, stale.content_hash))
+        return {path: hashes[path] for path in stats_df.path}
+
+    def pending(self, stage: Union[str, list[str]], hashes: dict[str, str]) -> list[str]:
+        """
+        Locations from `hashes` whose content is not done for `stage` yet, or
+        for any of several stages; order of `hashes` is preserved.
+        """
+        stages = [stage] if isinstance(stage, str) else list(stage)
+        hashes_df = pd.DataFrame({'location': list(hashes), 'content_hash': list(hashes.values())})
+        stages_df = pd.DataFrame({'stage': stages})
+        with self._connect() as con:
+            done = con.execute(
+                "select h.location from hashes_df h join ingestion_ledger l on h.content_hash = l.content_hash "
+                "where l.stage in (select stage from stages_df) and l.status = ? "
+                "group by h.location having count(distinct l.stage) = ?",
+                [STATUS_DONE, len(set(stages))],
+            ).fetchdf()
+        done = set(done.location)
+        return [location for location in hashes if location not in done]
+
+    def done(self, stages: list[str], hashes: dict[str, str]) -> set[str]:
+        """
+        Locations from `hashes` whose content is done for any of `stages`,
+        e.g. for one of the partitions of a backfill.
+        """
+        hashes_df = pd.DataFrame({'location': list(hashes), 'content_hash': list(hashes.values())})
+        stages_df = pd.DataFrame({'stage': list(stages)})
+        with self._connect() as con:
+            done = con.execute(
+                "select distinct h.location from hashes_df h join ingestion_ledger l on h.content_hash = l.content_hash "
+                "where l.stage in (select stage from stages_df) and l.status = ?",
+                [STATUS_DONE],
+            ).fetchdf()
+        return set(done.location)
+
+    def record(
+        self,
+        stage: str,
+        hashes: dict[str, str],
+        status: str = STATUS_DONE,
+        sop_instance_uids: Optional[dict[str, str]] = None,
+    ) -> None:
+        """
+        Record `status` of `stage` for every location of `hashes`, together
+        with SOPInstanceUID of the instance when known.
+        """
+        sop_instance_uids = sop_instance_uids or {}
+        ledger_df = pd.DataFrame({
+            'content_hash': list(hashes.values()),
+            'stage': stage,
+            'sop_instance_uid': [sop_instance_uids.get(location) for location in hashes],
+            'location': list(hashes),
+            'status': status,
+            'updated_at': time.time(),
+        })
+        if len(ledger_df) == 0:
+            return
+        with self._connect() as con:
+            con.execute(
+                "insert or replace into ingestion_ledger "
+                "select content_hash, stage, sop_instance_uid, location, status, updated_at from ledger_df"
+            )
+
+    def _connect(self):
+        con = duckdb.connect(database=self.duckdb_path, read_only=False)
+        con.execute(
+            "create table if not exists ingestion_ledger ("
+            "content_hash varchar, stage varchar, sop_instance_uid varchar, location varchar, "
+            "status varchar, updated_at double, primary key (content_hash, stage))"
+        )
+        con.execute(
+            "create table if not exists file_hash ("
+            "path varchar primary key, size bigint, mtime double, content_hash varchar)"
+        )
+        return con
@@ -29,7 +29,8 @@ def construct_lambda_client(
     check.opt_str_param(profile_name, "aws_session_token")
 
     client_session = boto3.session.Session(profile_name=profile_name)
-    lambda_client = client_session.resource(
+    # lambda has no boto3 resource interface, only a client
+    lambda_client = client_session.client(
         "lambda",
         region_name=region_name,
         use_ssl=use_ssl,
@@ -39,7 +40,7 @@ def construct_lambda_client(
         aws_secret_access_key=aws_secret_access_key,
         aws_session_token=aws_session_token,
         config=construct_boto_client_retry_config(max_attempts),
-    ).meta.client
+    )
     return lambda_client
 
 class LambdaConfig(Config):
@@ -49,6 +50,14 @@ class LambdaConfig(Config):
     client_context: Optional[str]
     payload: Optional[str]
     qualifier: str
+    # keys are split into shards of about `shard_size_mb` and `max_shard_files`
+    # at most, each shard is handled by a separate asynchronous invocation
+    shard_size_mb: int = 512
+    max_shard_files: int = 1000
+    # shards in flight at once and polling of their result manifests on s3
+    max_concurrency: int = 16
+    poll_interval_s: float = 5.0
+    timeout_s: float = 900.0
 
 class LambdaResource(ResourceWithS3Configuration, IAttachDifferentObjectToOpContext):
     """Resource that gives access to AWS Lambda function.
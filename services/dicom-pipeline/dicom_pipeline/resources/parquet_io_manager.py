@@ -1,10 +1,13 @@
 from pyspark.sql import DataFrame as PySparkDataFrame
 from pyspark.sql.functions import date_format
-from typing import Union
+from typing import Iterable, Iterator, Union
 import os
+import uuid
 import pandas
 import pyspark
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
 import pyarrow.parquet as pq
 from dagster import (
 	ConfigurableIOManager,
@@ -41,7 +44,7 @@ class PartitionedParquetIOManager(ConfigurableIOManager):
         raise NotImplementedError()
 
     def handle_output(
-        self, context: OutputContext, obj: Union[pandas.DataFrame, PySparkDataFrame]
+        self, context: OutputContext, obj: Union[pandas.DataFrame, PySparkDataFrame, pa.Table, Iterator[pa.RecordBatch]]
     ):
         path = self._get_path(context)
         if "://" not in self._base_path:
@@ -50,8 +53,9 @@ class PartitionedParquetIOManager(ConfigurableIOManager):
         partition_column = context.metadata.get("partition_expr")
         if partition_column is not None:
             if isinstance(obj, pandas.DataFrame):
-                row_count = obj.count()
-                # format properly to partition folders
+                row_count = len(obj)
+                # format properly to partition folders; rows of a single run
+                # backfill span several months and land in all of them at once
                 obj['date'] = obj[partition_column].dt.strftime(PARTITION_OUT_DATE_FORMAT)
                 table = pa.Table.from_pandas(obj)
 
@@ -62,6 +66,35 @@ class PartitionedParquetIOManager(ConfigurableIOManager):
                     root_path=path,
                     partition_cols=['date'],
                 )
+                context.add_output_metadata({
+                    "row_count": row_count,
+                    "path": path,
+                    "num_partitions_written": int(obj['date'].nunique()),
+                })
+            elif isinstance(obj, (pa.Table, Iterator)):
+                # record batches are written one by one, every call adds new
+                # fragments to partition folders
+                row_count = 0
+                partitions = set()
+                tables = [obj] if isinstance(obj, pa.Table) else (pa.Table.from_batches([batch]) for batch in obj)
+                for table in tables:
+                    dates = pc.strftime(
+                        table[partition_column].cast(pa.timestamp('s')),
+                        format=PARTITION_OUT_DATE_FORMAT
+                    )
+                    pq.write_to_dataset(
+                        table.append_column('date', dates),
+                        existing_data_behavior=PYARROW_EXISTING_DATA_BEHAVIOR,
+                        root_path=path,
+                        partition_cols=['date'],
+                    )
+                    row_count += table.num_rows
+                    partitions.update(pc.unique(dates.drop_null()).to_pylist())
+                context.add_output_metadata({
+                    "row_count": row_count,
+                    "path": path,
+                    "num_partitions_written": len(partitions),
+                })
             elif isinstance(obj, PySparkDataFrame):
                 row_count = obj.count()
                 obj.withColumn('date', date_format(partition_column, PARTITION_OUT_DATE_FORMAT)) \
@@ -81,6 +114,10 @@ class PartitionedParquetIOManager(ConfigurableIOManager):
                     obj.to_parquet(path=path, index=False, engine='fastparquet', append=True)
                 else:
                     raise DagsterError(f"Unexpected type for pyspark write mode: {PYSPARK_WRITE_MODE}")
+            elif isinstance(obj, (pa.Table, Iterator)):
+                # record batches are streamed into a single file, schema is taken from the first batch
+                tables = [obj] if isinstance(obj, pa.Table) else (pa.Table.from_batches([batch]) for batch in obj)
+                row_count = self._write_tables(context, tables, path)
             elif isinstance(obj, PySparkDataFrame):
                 row_count = obj.count()
                 obj.write.parquet(path=path, mode=PYSPARK_WRITE_MODE)
@@ -89,6 +126,49 @@ class PartitionedParquetIOManager(ConfigurableIOManager):
 
             context.add_output_metadata({"row_count": row_count, "path": path})
 
+    def _write_tables(self, context: OutputContext, tables: Iterable[pa.Table], path: str) -> int:
+        """
+        Write arrow `tables` to `path` the way `PYSPARK_WRITE_MODE` writes
+        spark frames: overwrite replaces data at `path`, append adds a part
+        file to the directory at `path`, error fails and ignore skips the
+        write when data exists. Returns the number of rows written.
+        """
+        filesystem, fs_path = pafs.FileSystem.from_uri(path) if "://" in path else (pafs.LocalFileSystem(), path)
+        existing = filesystem.get_file_info(fs_path).type
+        if existing != pafs.FileType.NotFound:
+            if PYSPARK_WRITE_MODE in ('error', 'errorifexists'):
+                raise DagsterError(f"Data already exists at {path}, write mode is {PYSPARK_WRITE_MODE}")
+            if PYSPARK_WRITE_MODE == 'ignore':
+                context.log.info(f"Data already exists at {path}, skipping the write")
+                return 0
+        if PYSPARK_WRITE_MODE in ('overwrite', 'error', 'errorifexists', 'ignore'):
+            target = fs_path
+        elif PYSPARK_WRITE_MODE == 'append':
+            if existing == pafs.FileType.File:
+                # a file written in overwrite mode becomes the first part of the directory
+                first_part = f"{fs_path}.{uuid.uuid4().hex}"
+                filesystem.move(fs_path, first_part)
+                filesystem.create_dir(fs_path)
+                filesystem.move(first_part, f"{fs_path}/part-{uuid.uuid4().hex}.parquet")
+            target = f"{fs_path}/part-{uuid.uuid4().hex}.parquet"
+        else:
+            raise DagsterError(f"Unexpected type for pyspark write mode: {PYSPARK_WRITE_MODE}")
+
+        row_count = 0
+        writer = None
+        for table in tables:
+            if writer is None:
+                if target == fs_path and existing == pafs.FileType.Directory:
+                    filesystem.delete_dir(fs_path)
+                elif target != fs_path:
+                    filesystem.create_dir(fs_path)
+                writer = pq.ParquetWriter(target, table.schema, filesystem=filesystem)
+            writer.write_table(table)
+            row_count += table.num_rows
+        if writer is not None:
+            writer.close()
+        return row_count
+
     def load_input(self, context) -> Union[PySparkDataFrame, str]:
         path = self._get_path(context)
         if context.dagster_type.typing_type == PySparkDataFrame:
@@ -0,0 +1,35 @@
+"""
+S3 clients built from the settings of an `S3Resource`, shared by ops,
+resources and readers that need more than `S3Resource.get_client()` offers,
+e.g. a connection pool sized for concurrent requests.
+"""
+from typing import Any
+import boto3
+from botocore import UNSIGNED
+from botocore.config import Config
+from dagster_aws.s3 import S3Resource
+
+
+def tuned_s3_client(s3_resource: S3Resource, max_concurrency: int) -> Any:
+    """
+    Client with the settings of `s3_resource`, a connection pool large enough
+    for `max_concurrency` requests at once and adaptive retries, to be shared
+    by all workers of a transfer.
+    """
+    session = boto3.session.Session(profile_name=s3_resource.profile_name or None)
+    config = Config(
+        max_pool_connections=max_concurrency,
+        retries={"max_attempts": s3_resource.max_attempts, "mode": "adaptive"},
+        signature_version=UNSIGNED if s3_resource.use_unsigned_session else None,
+    )
+    return session.client(
+        "s3",
+        region_name=s3_resource.region_name or None,
+        endpoint_url=s3_resource.endpoint_url,
+        use_ssl=s3_resource.use_ssl,
+        verify=s3_resource.verify,
+        aws_access_key_id=s3_resource.aws_access_key_id or None,
+        aws_secret_access_key=s3_resource.aws_secret_access_key or None,
+        aws_session_token=s3_resource.aws_session_token or None,
+        config=config,
+    )
@@ -0,0 +1,196 @@
+from datetime import datetime, timezone
+from typing import Optional
+import json
+import os
+import re
+import duckdb
+import inflection as inf
+from pydantic import Field
+from dagster import ConfigurableResource, get_dagster_logger
+from dagster_aws.s3 import S3Resource
+from .config import S3_INVENTORY_CACHE_PATH, S3_LIST_MAX_WORKERS
+from .s3_client import tuned_s3_client
+
+# inventories of a configuration are written to folders named by the time they were taken
+INVENTORY_FOLDER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}Z$")
+
+
+class S3InventoryResource(ConfigurableResource):
+    """
+    Keys of a bucket read from its latest S3 Inventory instead of listing
+    the bucket. CSV and Parquet data files of the inventory are scanned by
+    DuckDB at once, filtered by prefix and month of modification and diffed
+    against stages of the ingestion ledger. Data files on s3 are downloaded
+    to `cache_dir` once, inventories are immutable; they are read with the
+    settings and credentials of `s3`.
+    """
+    location: str = Field(
+        default="",
+        description=(
+            "Folder of an inventory configuration, `s3://<bucket>/<prefix>/<source bucket>/<config id>` "
+            "or a local directory of the same layout; empty disables the inventory."
+        ),
+    )
+    s3: S3Resource = Field(
+        description="S3 resource of the bucket the inventory is delivered to.",
+    )
+    cache_dir: str = Field(
+        default=S3_INVENTORY_CACHE_PATH,
+        description="Directory data files of inventories on s3 are downloaded to.",
+    )
+    overlap_hours: int = Field(
+        default=24,
+        description=(
+            "Objects modified this long before an inventory was taken are listed live as well, "
+            "inventories are eventually consistent."
+        ),
+    )
+    live_prefixes: list[str] = Field(
+        default=[],
+        description="Prefixes listed live for objects modified since the inventory, the whole bucket prefix when empty.",
+    )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.location)
+
+    def latest_manifest(self) -> Optional[dict]:
+        """
+        Manifest of the latest inventory along with the time it was taken in
+        `created_at` and local paths of its data files in `paths`; None when
+        there is no inventory yet.
+        """
+        for folder in sorted(self._folders(), reverse=True):
+            manifest = self._read_manifest(folder)
+            if manifest is None:
+                continue
+            manifest["created_at"] = datetime.fromtimestamp(int(manifest["creationTimestamp"]) / 1000, tz=timezone.utc)
+            manifest["paths"] = [self._data_file(manifest, f["key"]) for f in manifest["files"]]
+            return manifest
+        return None
+
+    def select_keys(
+        self,
+        manifest: dict,
+        prefix: str = "",
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        ledger_path: Optional[str] = None,
+        stage: Optional[str] = None,
+    ) -> list[str]:
+        """
+        Keys of current objects in the inventory of `manifest` under `prefix`,
+        modified in `month` of `year` when given; with `stage`, keys whose
+        ETag is done for the stage in the ledger at `ledger_path` are dropped.
+        Inventories without the optional last modified field are not filtered
+        by month, the live listing still is.
+        """
+        con = duckdb.connect()
+        con.execute("set TimeZone = 'UTC'")
+        if manifest["fileFormat"] == "CSV":
+            # csv files are gzipped without a header, keys are url encoded
+            fields = [inf.underscore(f.strip()) for f in manifest["fileSchema"].split(",")]
+            columns = "{" + ", ".join(f"'{f}': 'varchar'" for f in fields) + "}"
+            source = f"read_csv($paths, header = false, columns = {columns})"
+            key = "url_decode(replace(key, '+', '%20'))"
+            last_modified = "cast(replace(last_modified_date, 'Z', '') as timestamp)"
+            flag = "cast({} as boolean)"
+        elif manifest["fileFormat"] == "Parquet":
+            source = "read_parquet($paths)"
+            # schema of parquet inventories is a message type, fields are named in the files
+            fields = [c[0] for c in con.execute(f"select * from {source} limit 0", {"paths": manifest["paths"]}).description]
+            key = "key"
+            last_modified = "cast(last_modified_date as timestamp)"
+            flag = "{}"
+        else:
+            raise ValueError(f"Unsupported inventory format {manifest['fileFormat']}, use CSV or Parquet")
+
+        conditions = ["starts_with(i.key, $prefix)"]
+        params = {"paths": manifest["paths"], "prefix": prefix}
+        # versioned buckets list every version, only the current one of live objects is kept
+        if "is_latest" in fields:
+            conditions.append(f"{flag.format('i.is_latest')}")
+        if "is_delete_marker" in fields:
+            conditions.append(f"not {flag.format('i.is_delete_marker')}")
+        if year is not None and month is not None and "last_modified_date" not in fields:
+            get_dagster_logger().warning(
+                "S3 inventory has no last modified date field, keys are not filtered by month"
+            )
+        elif year is not None and month is not None:
+            conditions.append("year(i.last_modified) = $year and month(i.last_modified) = $month")
+            params.update(year=year, month=month)
+        if stage is not None and ledger_path is not None and os.path.exists(ledger_path):
+            con.execute(f"attach '{ledger_path}' as ledger (read_only)")
+            # the ledger keeps ETags quoted the way head_object returns them
+            match = "trim(l.content_hash, '\"') = i.e_tag" if "e_tag" in fields else "l.location = i.key"
+            conditions.append(
+                "not exists (select 1 from ledger.ingestion_ledger l "
+                f"where l.stage = $stage and l.status = 'done' and {match})"
+            )
+            params["stage"] = stage
+        e_tag = "e_tag" if "e_tag" in fields else "null"
+        if "last_modified_date" not in fields:
+            last_modified = "null"
+        flags = ", ".join(f for f in ("is_latest", "is_delete_marker") if f in fields)
+        query = (
+            f"with i as (select {key} as key, {last_modified} as last_modified, {e_tag} as e_tag"
+            f"{', ' + flags if flags else ''} from {source}) "
+            f"select distinct i.key from i where {' and '.join(conditions)} order by i.key"
+        )
+        try:
+            return [row[0] for row in con.execute(query, params).fetchall()]
+        finally:
+            con.close()
+
+    def _is_s3(self) -> bool:
+        return self.location.startswith("s3://")
+
+    def _bucket_prefix(self) -> tuple[str, str]:
+        bucket, _, prefix = self.location[len("s3://"):].partition("/")
+        return bucket, prefix.rstrip("/")
+
+    def _client(self):
+        return tuned_s3_client(self.s3, S3_LIST_MAX_WORKERS)
+
+    def _folders(self) -> list[str]:
+        if not self._is_s3():
+            if not os.path.isdir(self.location):
+                return []
+            return [f for f in os.listdir(self.location) if INVENTORY_FOLDER_PATTERN.match(f)]
+        bucket, prefix = self._bucket_prefix()
+        paginator = self._client().get_paginator("list_objects_v2")
+        folders = []
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/", Delimiter="/"):
+            for p in page.get("CommonPrefixes", []):
+                name = p["Prefix"].rstrip("/").rsplit("/", 1)[-1]
+                if INVENTORY_FOLDER_PATTERN.match(name):
+                    folders.append(name)
+        return folders
+
+    def _read_manifest(self, folder: str) -> Optional[dict]:
+        if not self._is_s3():
+            path = os.path.join(self.location, folder, "manifest.json")
+            if not os.path.isfile(path):
+                return None
+            with open(path) as fp:
+                return json.load(fp)
+        bucket, prefix = self._bucket_prefix()
+        client = self._client()
+        try:
+            body = client.get_object(Bucket=bucket, Key=f"{prefix}/{folder}/manifest.json")["Body"].read()
+        except client.exceptions.NoSuchKey:
+            # manifest is written last, the inventory is not complete yet
+            return None
+        return json.loads(body)
+
+    def _data_file(self, manifest: dict, key: str) -> str:
+        if not self._is_s3():
+            # data files sit in `data/` of the configuration folder
+            return os.path.join(self.location, "data", key.rsplit("/data/", 1)[-1])
+        bucket = manifest["destinationBucket"].rsplit(":", 1)[-1]
+        path = os.path.join(self.cache_dir, bucket, key)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._client().download_file(bucket, key, f"{path}.part")
+            os.replace(f"{path}.part", path)
+        return path
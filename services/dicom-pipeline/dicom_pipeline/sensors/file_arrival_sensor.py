@@ -1,6 +1,6 @@
-import pandas as pd
 import glob
 import os
+from dagster_aws.s3 import S3FileManagerResource, S3Resource
 from dagster_aws.s3.sensor import get_s3_keys
 from dagster import (
 	DefaultSensorStatus,
@@ -12,6 +12,12 @@ from dagster import (
 	SensorEvaluationContext,
 	SkipReason,
 )
+from ..ops.outer.copy_provider_data import s3_copy_provider_data
+from ..ops.raw.compress_pixel_data import compress_pixel_data
+from ..ops.utils import discover_s3_keys
+from ..resources import DicomFileIndexResource, IngestionLedgerResource
+from ..resources.ingestion_ledger import ingestion_stage
+from ..resources.s3_inventory import S3InventoryResource
 from ..resources.config import (
 	COLUMN_PARTITION_MAP,
 	PARTITION_MONTHLY,
@@ -20,7 +26,10 @@ from ..resources.config import (
 )
 from ..assets.raw import (
 	COLUMN_MAP,
-	RawConfig
+	MONTHLY_ENTITIES,
+	RawConfig,
+	monthly_entities,
+	reference_entities
 )
 
 def make_scan_s3_provider_bucket_sensor(
@@ -37,7 +46,33 @@ def make_scan_s3_provider_bucket_sensor(
 	)
     def s3_provider_sensor(
     	context: SensorEvaluationContext,
+    	s3_provider: S3Resource,
+    	s3_provider_io: S3FileManagerResource,
+    	s3_provider_inventory: S3InventoryResource,
+    	ingestion_ledger: IngestionLedgerResource,
     ):
+        if s3_provider_inventory.enabled:
+            # keys not copied yet from the latest inventory and objects written since
+            s3_keys = sorted(discover_s3_keys(
+                context,
+                None,
+                s3_provider,
+                s3_provider_io,
+                s3_provider_inventory,
+                ingestion_ledger,
+                s3_copy_provider_data.name
+            ))
+            if not s3_keys:
+                yield SkipReason(f"No new files found: s3://{s3_conf_provider.s3_bucket}/{s3_conf_provider.s3_prefix}")
+                return
+            # pending keys stay the same until copied, so the run key changes only with new ones
+            yield RunRequest(
+                job_name=job.name,
+                run_key=f"{len(s3_keys)}:{s3_keys[-1]}",
+                run_config={}
+            )
+            return
+
         since_key = context.cursor or None
         s3_keys = get_s3_keys(s3_conf_provider.s3_bucket, prefix=s3_conf_provider.s3_prefix, since_key=since_key)
         if not s3_keys:
@@ -96,8 +131,10 @@ def make_scan_s3_raw_bucket_sensor(
     		job_name=job.name,
     		run_key=last_key,
     		run_config=RunConfig(ops={
-			    's3_get_raw_files': {
+			    # keys are filtered by month when listed, files are only downloaded
+			    'get_raw_keys': {
 			    	'config': {
+			    		'column': COLUMN_PARTITION_MAP['images'],
 			    		'month': partition_date.month,
 			    		'year': partition_date.year
 			    	}
@@ -125,7 +162,11 @@ def make_scan_file_sensor(
 		name=f'file_sensor_on_{job.name}{f"_with_{compress_job.name}" if compress_job is not None else ""}',
 		job=job,
 	)
-    def my_dir_sensor(context):
+    def my_dir_sensor(
+		context,
+		dicom_file_index: DicomFileIndexResource,
+		ingestion_ledger: IngestionLedgerResource
+	):
         last_mtime = float(context.cursor) if context.cursor else 0
         max_mtime = last_mtime
 
@@ -150,38 +191,57 @@ def make_scan_file_sensor(
             yield SkipReason(f"No files found in {dir}.")
         context.log.info(f"Launching materialization for: {list(COLUMN_MAP.keys())}")
 
-        if compress_job is not None:
+        # launch other assets for dbt / dagster; entities sharing partitioning
+        # are extracted by a single multi asset from the same set of files
+        raw_config = RawConfig(files=dicom_files)
+        context.log.info(raw_config)
+
+        # file index resolves partitions covered by files without re-reading them,
+        # so every monthly run receives only files that belong to its month;
+        # files already ingested for the month are dropped using the ledger
+        dicom_file_index.update(dicom_files)
+        hashes = ingestion_ledger.file_hashes(dicom_files)
+        partition_columns = sorted(set(COLUMN_PARTITION_MAP[asset] for asset in MONTHLY_ENTITIES))
+        partition_keys = PARTITION_MONTHLY.get_partition_keys()
+        partition_files = {}
+        for partition_key in dicom_file_index.partition_keys(dicom_files, partition_columns):
+            if partition_key not in partition_keys:
+                continue
+            start, end = PARTITION_MONTHLY.time_window_for_partition_key(partition_key)
+            # rows of a file are recorded under the month of their own partition column
+            new_files = set()
+            for asset in MONTHLY_ENTITIES:
+                files = dicom_file_index.select(dicom_files, [COLUMN_PARTITION_MAP[asset]], start, end)
+                new_files.update(ingestion_ledger.pending(
+                    ingestion_stage(asset, partition_key), {f: hashes[f] for f in files if f in hashes}
+                ))
+            if new_files:
+                partition_files[partition_key] = [f for f in dicom_files if f in new_files]
+        # every file is compressed once, also those outside of the partitions
+        compress_files = ingestion_ledger.pending(compress_pixel_data.name, hashes) if compress_job is not None else []
+        if not partition_files and not compress_files:
+            yield SkipReason(f"No new files to ingest in {directory}.")
+            return
+
+        if compress_files:
             yield RunRequest(
     	    	job_name=compress_job.name,
                 run_key=f'compress_pixel_data:{file_mtime}',
                 run_config=RunConfig(ops={
 		        	'compress_pixel_data': {
-		        		'raw_files': dicom_files,
+		        		'raw_files': sorted(compress_files),
 		        	},
 		        })
             )
-        run_config = {}
-        # launch other assets for dbt / dagster
-        for asset, columns in COLUMN_MAP.items():
-            raw_config = RawConfig(
-                columns=columns,
-                asset=asset,
-			    files=dicom_files,
-    		    partition_column=COLUMN_PARTITION_MAP.get(asset)
-            )
-            run_config[asset] = raw_config
-
-        context.log.info(raw_config)
-        date_range = pd.date_range(
-			start=PARTITION_MONTHLY.start.date(),
-			end=PARTITION_MONTHLY.end.date(),
-			freq='M'
-		)
-        for date in date_range:
+        for partition_key, files in partition_files.items():
+            run_config = {
+                monthly_entities.op.name: RawConfig(files=files),
+                reference_entities.op.name: raw_config,
+            }
             yield RunRequest(
-                run_key = f"raw-assets:{file_mtime}",
+                run_key = f"raw-assets:{file_mtime}:{partition_key}",
                 run_config=RunConfig(ops=run_config),
-    	    	partition_key=date.strftime("%Y-%m")
+    	    	partition_key=partition_key
             )
         context.update_cursor(str(max(max_mtime, file_mtime)))
     return my_dir_sensor
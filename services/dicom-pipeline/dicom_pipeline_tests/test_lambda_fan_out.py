@@ -0,0 +1,76 @@
+import io
+import json
+import zipfile
+import boto3
+from dagster import build_op_context
+from moto import mock_aws
+from dicom_pipeline.ops.utils import fan_out_lambda, write_shard_manifests
+from dicom_pipeline.resources.lambda_resource import LambdaResource
+
+REGION = "us-east-1"
+BUCKET = "stage-bucket"
+FUNCTION = "img-compressor"
+
+
+def create_function(lambda_client):
+    iam = boto3.client("iam", region_name=REGION)
+    role = iam.create_role(
+        RoleName="img-compressor",
+        AssumeRolePolicyDocument=json.dumps({"Version": "2012-10-17", "Statement": []}),
+    )
+    code = io.BytesIO()
+    with zipfile.ZipFile(code, "w") as zf:
+        zf.writestr("bootstrap", "")
+    lambda_client.create_function(
+        FunctionName=FUNCTION,
+        Runtime="provided.al2",
+        Role=role["Role"]["Arn"],
+        Handler="bootstrap",
+        Code={"ZipFile": code.getvalue()},
+    )
+
+
+def compress_shard(s3_client):
+    # stands in for the function: reads the shard manifest and puts a result line per file
+    def on_invoke(params, **kwargs):
+        event = json.loads(params["Payload"])
+        manifest = json.loads(
+            s3_client.get_object(Bucket=event["manifest_bucket"], Key=event["manifest_key"])["Body"].read()
+        )
+        results = [
+            json.dumps({"file": f, "status": "ok", "key": f"{manifest['target_prefix']}/{f}.jpeg"})
+            for f in manifest["files"]
+        ]
+        s3_client.put_object(
+            Bucket=manifest["result_bucket"], Key=manifest["result_key"], Body="\n".join(results).encode()
+        )
+    return on_invoke
+
+
+@mock_aws(config={"lambda": {"use_docker": False}})
+def test_fan_out_lambda_reads_shard_results():
+    s3_client = boto3.client("s3", region_name=REGION)
+    s3_client.create_bucket(Bucket=BUCKET)
+    lambda_client = LambdaResource(region_name=REGION).get_client()
+    create_function(lambda_client)
+    lambda_client.meta.events.register("provide-client-params.lambda.Invoke", compress_shard(s3_client))
+
+    payload = {"source_bucket": "raw", "source_prefix": "raw", "target_bucket": BUCKET, "target_prefix": "stage"}
+    manifests = write_shard_manifests(s3_client, BUCKET, "lambda_manifests/run", payload, [["a.dcm", "b.dcm"], ["c.dcm"]])
+    results = fan_out_lambda(build_op_context(), lambda_client, s3_client, FUNCTION, None, manifests, 1, 0.0, 10.0)
+
+    assert {f: r["status"] for f, r in results.items()} == {"a.dcm": "ok", "b.dcm": "ok", "c.dcm": "ok"}
+    assert results["c.dcm"]["key"] == "stage/c.dcm.jpeg"
+
+
+@mock_aws(config={"lambda": {"use_docker": False}})
+def test_fan_out_lambda_times_out_shards_without_results():
+    s3_client = boto3.client("s3", region_name=REGION)
+    s3_client.create_bucket(Bucket=BUCKET)
+    lambda_client = LambdaResource(region_name=REGION).get_client()
+    create_function(lambda_client)
+
+    manifests = write_shard_manifests(s3_client, BUCKET, "lambda_manifests/run", {}, [["a.dcm"]])
+    results = fan_out_lambda(build_op_context(), lambda_client, s3_client, FUNCTION, None, manifests, 1, 0.0, 0.0)
+
+    assert results == {"a.dcm": {"file": "a.dcm", "status": "error", "error": "timed out"}}
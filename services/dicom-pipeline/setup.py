@@ -28,7 +28,8 @@ setup(
 		"inflection",
         "matplotlib",
         "pandas",
-        "pyarrow>=4.0.0",
+        "pillow",
+        "pyarrow>=14.0.0",
 		"pydantic_vault",
         "pydicom",
         "pyspark",
@@ -1,3 +1,4 @@
+use aws_sdk_s3::primitives::ByteStream;
 use chrono::NaiveDate;
 use dicom_dictionary_std::tags;
 use img_compressor::*;
@@ -5,7 +6,7 @@ use lambda_runtime::{service_fn, Error, LambdaEvent};
 use lazy_static::lazy_static;
 use rayon::prelude::*;
 use serde_derive::{Deserialize, Serialize};
-use std::{path::Path, sync::Arc};
+use std::{io::Read, path::Path, sync::Arc};
 use tokio::sync::Mutex;
 use tracing::{error, info};
 lazy_static! {
@@ -25,6 +26,27 @@ pub struct ImgCompressorConfig {
     pub target_prefix: String, // future folder for compressed image
     #[serde(rename = "files")]
     pub files: Vec<String>, // List of dicom files as keys on s3 with prefix
+    #[serde(rename = "result_bucket", default)]
+    pub result_bucket: Option<String>, // S3 bucket to put per file results to
+    #[serde(rename = "result_key", default)]
+    pub result_key: Option<String>, // key of json lines with per file results
+}
+
+#[derive(Serialize, Deserialize, Debug)]
+pub struct ManifestLocation {
+    #[serde(rename = "manifest_bucket")]
+    pub manifest_bucket: String, // S3 bucket holding a shard manifest
+    #[serde(rename = "manifest_key")]
+    pub manifest_key: String, // key of `ImgCompressorConfig` of a shard as json
+}
+
+// events carry either the whole config or location of a shard manifest on s3,
+// the latter keeps payloads of large batches under the lambda limit
+#[derive(Serialize, Deserialize, Debug)]
+#[serde(untagged)]
+pub enum ImgCompressorEvent {
+    Manifest(ManifestLocation),
+    Config(ImgCompressorConfig),
 }
 
 #[tokio::main(flavor = "current_thread")]
@@ -33,26 +55,176 @@ async fn main() -> Result<(), Box<dyn std::error::Error + Send + Sync + 'static>
         .with_max_level(tracing::Level::INFO)
         .with_target(false)
         .without_time()
+        .with_writer(std::io::stderr)
         .init();
 
+    // `--manifest <path|->` compresses local files listed in a config file
+    // instead of serving lambda events, used by the local worker pool
+    let args: Vec<String> = std::env::args().collect();
+    if let Some(i) = args.iter().position(|arg| arg == "--manifest") {
+        let path = args.get(i + 1).map(String::as_str).unwrap_or("-");
+        let mut manifest = String::new();
+        if path == "-" {
+            std::io::stdin().read_to_string(&mut manifest)?;
+        } else {
+            manifest = std::fs::read_to_string(path)?;
+        }
+        let config: ImgCompressorConfig = serde_json::from_str(&manifest)?;
+        return run_manifest(config).await;
+    }
+
     lambda_runtime::run(service_fn(handler)).await
 }
 
-async fn handler(event: LambdaEvent<ImgCompressorConfig>) -> Result<(), Error> {
+async fn run_manifest(
+    config: ImgCompressorConfig,
+) -> Result<(), Box<dyn std::error::Error + Send + Sync + 'static>> {
+    let _ = instantiate_dir(Path::new(&DIR_OUT.clone())).await;
+    let aws_config = aws_config::load_from_env().await;
+    let client = aws_sdk_s3::Client::new(&aws_config);
+
+    // one json line per file on stdout, logs are written to stderr
+    for file in config.files.iter() {
+        let result = match compress_local_file(&client, &config, file).await {
+            Ok(s3_key) => serde_json::json!({"file": file, "status": "ok", "key": s3_key}),
+            Err(e) => {
+                error!("Error compressing `{file}`, {e}");
+                serde_json::json!({"file": file, "status": "error", "error": e})
+            }
+        };
+        println!("{result}");
+    }
+    Ok(())
+}
+
+async fn run_s3_manifest(
+    client: &aws_sdk_s3::Client,
+    location: ManifestLocation,
+) -> Result<(), Error> {
+    let manifest = download_object(client, &location.manifest_bucket, &location.manifest_key)
+        .await?
+        .body
+        .collect()
+        .await?
+        .into_bytes();
+    let config: Arc<ImgCompressorConfig> = Arc::new(serde_json::from_slice(&manifest)?);
+
+    // download every file of the shard, compress it and collect a json line per file;
+    // files are handled by the rayon pool like the `Config` path, each worker drives
+    // its s3 requests on the runtime while this task awaits the pool off the runtime thread
+    let handle = tokio::runtime::Handle::current();
+    let pool_client = client.clone();
+    let pool_config = config.clone();
+    let results: Vec<String> = tokio::task::spawn_blocking(move || {
+        pool_config
+            .files
+            .par_iter()
+            .map(|file| {
+                handle
+                    .block_on(compress_s3_file(&pool_client, &pool_config, file))
+                    .to_string()
+            })
+            .collect()
+    })
+    .await?;
+
+    if let (Some(result_bucket), Some(result_key)) = (&config.result_bucket, &config.result_key) {
+        client
+            .put_object()
+            .bucket(result_bucket)
+            .key(result_key)
+            .body(ByteStream::from(results.join("\n").into_bytes()))
+            .send()
+            .await?;
+        info!(
+            "Results of {} files put to `s3://{result_bucket}/{result_key}`",
+            results.len()
+        );
+    }
+    Ok(())
+}
+
+async fn compress_s3_file(
+    client: &aws_sdk_s3::Client,
+    config: &ImgCompressorConfig,
+    file: &str,
+) -> serde_json::Value {
+    let s3_file = format!("{}/{}", config.source_prefix, file);
+    let file_i = format!("{}{}", DIR_IN.clone(), file.replace('/', "_"));
+    let compressed = match download_object(client, &config.source_bucket, &s3_file).await {
+        Ok(object) => match object.body.collect().await {
+            Ok(data) => match std::fs::write(&file_i, data.into_bytes()) {
+                Ok(_) => compress_local_file(client, config, &file_i).await,
+                Err(e) => Err(e.to_string()),
+            },
+            Err(e) => Err(e.to_string()),
+        },
+        Err(e) => Err(e.to_string()),
+    };
+    let _ = std::fs::remove_file(&file_i);
+    match compressed {
+        Ok(s3_key) => serde_json::json!({"file": file, "status": "ok", "key": s3_key}),
+        Err(e) => {
+            error!("Error compressing `{s3_file}`, {e}");
+            serde_json::json!({"file": file, "status": "error", "error": e})
+        }
+    }
+}
+
+async fn compress_local_file(
+    client: &aws_sdk_s3::Client,
+    config: &ImgCompressorConfig,
+    file: &str,
+) -> Result<String, String> {
+    let sop_instance_uid = collect_tag_data(file.to_string(), tags::SOP_INSTANCE_UID);
+    let series_instance_uid = collect_tag_data(file.to_string(), tags::SERIES_INSTANCE_UID);
+    let instance_creation_date = collect_tag_data(file.to_string(), tags::INSTANCE_CREATION_DATE);
+
+    let file_name = format!("{series_instance_uid}|{sop_instance_uid}.jpeg");
+    let file_o = format!("{}{}", DIR_OUT.clone(), file_name);
+    save_image_data(file.to_string(), file_o.clone()).map_err(|e| e.to_string())?;
+    // without a target bucket images are kept locally, e.g. for benchmarks
+    if config.target_bucket.is_empty() {
+        return Ok(file_o);
+    }
+
+    let partition_date = NaiveDate::parse_from_str(&instance_creation_date, "%Y%m%d")
+        .map_err(|e| e.to_string())?
+        .format("%Y_%m");
+    let s3_key = format!(
+        "{}/compressed_images/{partition_date}/{file_name}",
+        config.target_prefix
+    );
+    let uploaded = upload_object(client, &config.target_bucket, &file_o, &s3_key).await;
+    let _ = std::fs::remove_file(&file_o);
+    uploaded.map_err(|e| e.to_string())?;
+    info!(
+        "Successful upload s3 file: `s3://{}/{s3_key}`",
+        config.target_bucket
+    );
+    Ok(s3_key)
+}
+
+async fn handler(event: LambdaEvent<ImgCompressorEvent>) -> Result<(), Error> {
     // create temporary file holders for download / upload
     let _ = instantiate_dir(Path::new(&DIR_IN.clone())).await;
     let _ = instantiate_dir(Path::new(&DIR_OUT.clone())).await;
 
     let config = aws_config::load_from_env().await;
     let client = aws_sdk_s3::Client::new(&config);
+
+    let payload = match event.payload {
+        ImgCompressorEvent::Manifest(location) => return run_s3_manifest(&client, location).await,
+        ImgCompressorEvent::Config(payload) => payload,
+    };
     let s3_cli = Arc::new(Mutex::new(client));
 
     // list of dicom files as keys on s3 with prefix
-    let files = event.payload.files;
-    let src_bucket = event.payload.source_bucket;
-    let src_prefix = event.payload.source_prefix;
-    let dst_bucket = event.payload.target_bucket;
-    let dst_prefix = event.payload.target_prefix;
+    let files = payload.files;
+    let src_bucket = payload.source_bucket;
+    let src_prefix = payload.source_prefix;
+    let dst_bucket = payload.target_bucket;
+    let dst_prefix = payload.target_prefix;
 
     // download s3 files, compress images to JPEG and upload back to s3 in parallel
     files.par_iter().for_each(|file| {